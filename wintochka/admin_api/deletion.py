@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from balances.models import Balance
+from orders.engine import OrderMatchingEngine
+from orders.models import ArchivedOrder, Execution, LimitOrder, MarketOrder, OrderStatus, PendingMatch
+from users.models import User
+from .models import UserDeletionJob
+
+logger = logging.getLogger(__name__)
+
+# Удаление пользователя короткими транзакциями вместо user.delete(): каскад
+# Django грузит все связанные строки в память и держит write-лок SQLite на всё
+# время удаления, останавливая матчинг. Здесь каждая пачка — своя транзакция,
+# открытые ордера пачки снимаются одним cancel_orders с возвратом резервов,
+# и стакан каждого затронутого тикера публикуется один раз после коммита.
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def _deactivate(user_id, batch_size):
+    # Новый api_key отзывает старый токен: пока идёт удаление, ордера не поступают
+    User.objects.filter(id=user_id).update(api_key=uuid.uuid4())
+    return 0
+
+
+def _cancel_open_orders(user_id, batch_size):
+    open_orders = LimitOrder.objects.filter(user_id=user_id, status__in=OrderStatus.OPEN)
+    with transaction.atomic():
+        # Первой идёт запись (см. intake.match_batch): ордера пользователя
+        # снимаются с очереди матчинга, новых при отозванном ключе не будет
+        PendingMatch.objects.filter(order_type=PendingMatch.LIMIT, order_id__in=open_orders.values("id")).delete()
+        ids = list(open_orders.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return 0
+        return OrderMatchingEngine.cancel_orders(ids)
+
+
+def _dequeue_market_orders(user_id, batch_size):
+    PendingMatch.objects.filter(
+        order_id__in=MarketOrder.objects.filter(user_id=user_id).values("id")
+    ).delete()
+    return 0
+
+
+def _batch_delete(queryset):
+    def step(user_id, batch_size):
+        with transaction.atomic():
+            ids = list(queryset.filter(user_id=user_id).values_list("pk", flat=True)[:batch_size])
+            if ids:
+                queryset.model.objects.filter(pk__in=ids).delete()
+        return len(ids)
+    return step
+
+
+def _delete_user(user_id, batch_size):
+    User.objects.filter(id=user_id).delete()
+    return 0
+
+
+# (stage, шаг, счётчик в задаче). Шаг повторяется, пока возвращает > 0
+STAGES = [
+    ("deactivate", _deactivate, None),
+    ("cancel_orders", _cancel_open_orders, "cancelled_orders"),
+    ("dequeue", _dequeue_market_orders, None),
+    ("market_orders", _batch_delete(MarketOrder.objects.all()), "deleted_rows"),
+    ("limit_orders", _batch_delete(LimitOrder.objects.all()), "deleted_rows"),
+    ("archived_orders", _batch_delete(ArchivedOrder.objects.all()), "deleted_rows"),
+    ("executions", _batch_delete(Execution.objects.all()), "deleted_rows"),
+    ("balances", _batch_delete(Balance.objects.all()), "deleted_rows"),
+    ("user", _delete_user, None),
+]
+
+
+def run_deletion(job):
+    batch_size = settings.USER_DELETION_BATCH_SIZE
+    names = [name for name, _, _ in STAGES]
+    # Возобновление после рестарта — с этапа, на котором задача остановилась
+    start = names.index(job.stage) if job.stage in names else 0
+    job.status = UserDeletionJob.RUNNING
+    job.save(update_fields=["status", "updated_at"])
+
+    try:
+        for name, step, counter in STAGES[start:]:
+            job.stage = name
+            job.save(update_fields=["stage", "updated_at"])
+            while True:
+                done = step(job.user_id, batch_size)
+                if not done:
+                    break
+                if counter:
+                    setattr(job, counter, getattr(job, counter) + done)
+                    job.save(update_fields=[counter, "updated_at"])
+                time.sleep(settings.USER_DELETION_BATCH_PAUSE)
+        job.status = UserDeletionJob.DONE
+        job.save(update_fields=["status", "updated_at"])
+        logger.info(f"User {job.user_id} deleted: cancelled={job.cancelled_orders}, rows={job.deleted_rows}")
+    except Exception as e:
+        logger.error(f"User deletion {job.id} failed at {job.stage}: {e}")
+        job.status = UserDeletionJob.FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+
+
+def _run_in_background(job_id):
+    try:
+        run_deletion(UserDeletionJob.objects.get(id=job_id))
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+        connection.close()
+
+
+def start_user_deletion(user):
+    """Ставит (или перезапускает упавшую) задачу удаления и запускает её в фоне"""
+    job, _ = UserDeletionJob.objects.get_or_create(user_id=user.id)
+    if job.status == UserDeletionJob.DONE:
+        return job
+    with _running_lock:
+        if job.id in _running:
+            return job
+        _running.add(job.id)
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_background, args=(job.id,), daemon=True).start()
+    )
+    return job
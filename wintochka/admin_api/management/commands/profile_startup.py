@@ -0,0 +1,101 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Каждый замер — в отдельном процессе с нужным DJANGO_SETTINGS_MODULE:
+# холодный старт = импорт Django, setup(), WSGI-приложение и корневой urlconf.
+# Накладные расходы на запрос меряются полным WSGI-вызовом пустого view, так
+# что в цифру попадает только middleware, сигналы и разбор запроса.
+
+CHILD = """
+import json, os, sys, time
+started = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+app = get_wsgi_application()
+import_module(settings.ROOT_URLCONF)
+startup = time.perf_counter() - started
+
+per_request = 0
+requests = int(sys.argv[1])
+if requests:
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    environ = RequestFactory()._base_environ(
+        PATH_INFO="/noop", REQUEST_METHOD="GET", HTTP_HOST=settings.ALLOWED_HOSTS[0]
+    )
+
+    def start_response(status, headers):
+        assert status.startswith("200"), status
+
+    with override_settings(ROOT_URLCONF="wintochka.urls_noop"):
+        for _ in range(min(requests, 100)):
+            app(dict(environ), start_response).close()
+        started = time.perf_counter()
+        for _ in range(requests):
+            app(dict(environ), start_response).close()
+        per_request = (time.perf_counter() - started) / requests
+print(json.dumps({"startup": startup, "per_request": per_request, "modules": len(sys.modules)}))
+"""
+
+
+def _package(module):
+    parts = module.strip().split(".")
+    return ".".join(parts[:3] if module.strip().startswith("django.contrib.") else parts[:2])
+
+
+class Command(BaseCommand):
+    help = "Холодный старт воркера, время импорта по модулям и накладные расходы middleware по профилям настроек"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settings-modules", default="wintochka.settings,wintochka.settings_api",
+            help="Профили настроек через запятую; первый — базовый для сравнения",
+        )
+        parser.add_argument("--runs", type=int, default=5, help="Холодных стартов на профиль")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--top", type=int, default=15, help="Сколько самых тяжёлых пакетов показать")
+
+    def _child(self, settings_module, args, importtime=False):
+        command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, str(args)]
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module}
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"{settings_module}: {result.stderr.strip().splitlines()[-1]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def _import_times(self, stderr):
+        """{пакет: собственное время импорта, мкс} из вывода python -X importtime"""
+        totals = defaultdict(int)
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            self_us, _, module = line[len("import time:"):].split("|")
+            totals[_package(module)] += int(self_us)
+        return totals
+
+    def handle(self, *args, **options):
+        baseline = None
+        for settings_module in options["settings_modules"].split(","):
+            startups = [self._child(settings_module, 0)[0]["startup"] for _ in range(options["runs"])]
+            measured, _ = self._child(settings_module, options["requests"])
+            _, stderr = self._child(settings_module, 0, importtime=True)
+            imports = self._import_times(stderr)
+
+            startup_ms = statistics.median(startups) * 1000
+            request_us = measured["per_request"] * 1e6
+            baseline = baseline or (startup_ms, request_us)
+            self.stdout.write(
+                f"{settings_module}: cold start {startup_ms:.0f}ms (x{startup_ms / baseline[0]:.2f}), "
+                f"{measured['modules']} modules, "
+                f"middleware {request_us:.1f}us/request (x{request_us / baseline[1]:.2f})"
+            )
+            for package, self_us in sorted(imports.items(), key=lambda item: -item[1])[:options["top"]]:
+                self.stdout.write(f"    {self_us / 1000:7.1f}ms  {package}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from admin_api.deletion import run_deletion
+from admin_api.models import UserDeletionJob
+
+
+class Command(BaseCommand):
+    help = "Доводит до конца задачи удаления пользователей, прерванные рестартом"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-failed", action="store_true", help="Перезапускать и упавшие задачи")
+
+    def handle(self, *args, **options):
+        statuses = [UserDeletionJob.PENDING, UserDeletionJob.RUNNING]
+        if options["retry_failed"]:
+            statuses.append(UserDeletionJob.FAILED)
+
+        for job in UserDeletionJob.objects.filter(status__in=statuses).order_by("created_at"):
+            run_deletion(job)
+            self.stdout.write(f"{job.user_id}: {job.status} (cancelled={job.cancelled_orders}, rows={job.deleted_rows})")
@@ -1,3 +1,24 @@
+import uuid
 from django.db import models
 
-# Create your models here.
+
+class UserDeletionJob(models.Model):
+    """Фоновое удаление пользователя: прогресс переживает рестарт процесса"""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Не ForeignKey: пользователь удаляется последним шагом самой задачи
+    user_id = models.UUIDField(unique=True)
+    status = models.CharField(
+        max_length=16, default=PENDING,
+        choices=[(PENDING, PENDING), (RUNNING, RUNNING), (DONE, DONE), (FAILED, FAILED)],
+    )
+    stage = models.CharField(max_length=32, blank=True)
+    cancelled_orders = models.PositiveIntegerField(default=0)
+    deleted_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,205 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from users.permissions import authenticate_api_key
+
+logger = logging.getLogger(__name__)
+
+# Профилирование по запросу. Админ добавляет заголовок X-Profile: 1 — запрос
+# выполняется под cProfile, а все SQL-запросы (в том числе из match_order и
+# execute_trade, они идут через то же соединение) пишутся с таймингами.
+# Если задан PROFILING_SLOW_REQUEST_MS, для всех запросов пишется SQL и
+# работает сэмплирующий профайлер (один поток на процесс раз в
+# PROFILING_SAMPLE_INTERVAL_MS снимает стеки потоков, обслуживающих запросы),
+# а сохраняется это только для медленных. cProfile на каждом запросе был бы
+# слишком дорог, а без профиля медленный запрос виден лишь по SQL. Без
+# заголовка и порога middleware ничего не делает. Результаты лежат JSON-файлами в PROFILING_DIR, хранятся последние
+# PROFILING_KEEP, читаются через /api/v1/admin/profiles.
+
+PROFILE_HEADER = "X-Profile"
+
+
+class QueryLog:
+    """execute_wrapper для connection: копит (sql, ms) текущего запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({"sql": sql, "many": many, "ms": round((time.perf_counter() - start) * 1000, 3)})
+
+
+class StackSampler:
+    """Сэмплирующий профайлер: фоновый поток копит стеки зарегистрированных потоков.
+
+    Стек — строка "file:line func;..." от внешнего кадра к текущему (формат
+    collapsed stacks для flamegraph). Пока никто не зарегистрирован, поток спит.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                thread_ids = list(self._samples)
+            if not thread_ids:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            stacks = {thread_id: _collapse(frames[thread_id]) for thread_id in thread_ids if thread_id in frames}
+            with self._lock:
+                for thread_id, stack in stacks.items():
+                    counter = self._samples.get(thread_id)
+                    if counter is not None:
+                        counter[stack] += 1
+            time.sleep(settings.PROFILING_SAMPLE_INTERVAL_MS / 1000)
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_filename}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+sampler = StackSampler()
+
+
+def _is_admin(request):
+    user = authenticate_api_key(request)
+    return user is not None and user.role == "ADMIN"
+
+
+def _rotate(directory, keep):
+    names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in names[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def save_profile(record):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    # Имя начинается со времени: сортировка по имени = сортировка по времени
+    record["id"] = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(directory, f"{record['id']}.json"), "w") as f:
+        json.dump(record, f)
+    _rotate(directory, settings.PROFILING_KEEP)
+    return record["id"]
+
+
+def list_profiles():
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted((name[:-5] for name in os.listdir(directory) if name.endswith(".json")), reverse=True)
+
+
+def load_profile(profile_id):
+    """None, если профиля нет (удалён ротацией или неверный id)"""
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    try:
+        with open(os.path.join(settings.PROFILING_DIR, f"{profile_id}.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_ms = settings.PROFILING_SLOW_REQUEST_MS
+        requested = PROFILE_HEADER in request.headers and _is_admin(request)
+        if not requested and slow_ms is None:
+            return self.get_response(request)
+
+        query_log = QueryLog()
+        profiler = cProfile.Profile() if requested else None
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        with connection.execute_wrapper(query_log):
+            if profiler is not None:
+                profiler.enable()
+            else:
+                sampler.start(thread_id)
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    samples = None
+                else:
+                    samples = sampler.stop(thread_id)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if not requested and duration_ms < slow_ms:
+            return response
+
+        record = {
+            "trigger": "header" if requested else "slow",
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+            "created_at": time.time(),
+            "sql_ms": round(sum(q["ms"] for q in query_log.queries), 3),
+            "queries": query_log.queries,
+        }
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(settings.PROFILING_TOP_FUNCTIONS)
+            record["profile"] = stream.getvalue()
+        if samples is not None:
+            record["sample_interval_ms"] = settings.PROFILING_SAMPLE_INTERVAL_MS
+            record["stacks"] = [
+                {"stack": stack, "samples": count}
+                for stack, count in samples.most_common(settings.PROFILING_TOP_FUNCTIONS)
+            ]
+
+        try:
+            response["X-Profile-Id"] = save_profile(record)
+        except OSError as e:
+            logger.error(f"Cannot save profile for {request.path}: {e}")
+        if not requested:
+            logger.warning(f"Slow request {request.method} {request.path}: {duration_ms:.1f} ms, {len(query_log.queries)} queries")
+        return response
@@ -1,3 +1,107 @@
-from django.test import TestCase
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from admin_api.deletion import run_deletion
+from admin_api.models import UserDeletionJob
+from admin_api.profiling import load_profile
+from orders import marketdata
+from orders.models import EventSequence, LimitOrder, OrderStatus
+from wintochka import settings_api
+from wintochka.testing import QueryBudgetTestCase
+
+
+class AdminBalanceQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user("client", RUB=1000)
+
+    def test_deposit_and_withdraw(self):
+        row = {"user_id": str(self.user.id), "ticker": "RUB", "amount": 10}
+        self.request(10, "post", "/api/v1/admin/balance/deposit", self.admin, row, status=200)
+        self.request(10, "post", "/api/v1/admin/balance/withdraw", self.admin, row, status=200)
+
+    def test_bulk(self):
+        def bulk(path):
+            def scenario(size):
+                users = [self.make_user(f"{path}{size}-{i}", RUB=1000) for i in range(size)]
+                rows = [{"user_id": str(user.id), "ticker": "RUB", "amount": 10} for user in users]
+                queries = self.capture("post", f"/api/v1/admin/balance/{path}/bulk", self.admin, {"rows": rows}, status=200)
+                self.assertEqual(queries.response.json()["applied"], size)
+                return queries
+
+            scenario.__name__ = f"bulk_{path}"
+            return scenario
+
+        # Пакет: запись пакета, отметка чанка, уже применённые строки, номера новых строк
+        self.assertScales(bulk("deposit"), base=13)
+        self.assertScales(bulk("withdraw"), base=13)
+
+
+class AdminInstrumentQueryBudgetTest(QueryBudgetTestCase):
+    def test_list_and_create(self):
+        self.request(2, "get", "/api/v1/admin/instrument", self.admin, status=200)
+        self.request(3, "post", "/api/v1/admin/instrument", self.admin, {"name": "Memecoin", "ticker": "MEM"}, status=201)
+
+    def test_delete_with_open_orders(self):
+        def delete_instrument(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            users = [self.make_user(f"{ticker}-{i}") for i in range(size)]
+            LimitOrder.objects.bulk_create(
+                LimitOrder(user=user, ticker=ticker, direction="BUY" if i % 2 else "SELL", price_ticks=100,
+                           original_qty=1, filled=0, status=OrderStatus.NEW, seq=EventSequence.next())
+                for i, user in enumerate(users)
+            )
+            queries = self.capture("delete", f"/api/v1/admin/instrument/{ticker}", self.admin, status=200)
+            self.assertEqual(queries.response.json()["cancelled_orders"], size)
+            return queries
+
+        self.assertScales(delete_instrument, base=27)
+
+
+class AdminUserQueryBudgetTest(QueryBudgetTestCase):
+    def test_delete_user(self):
+        user = self.make_user("leaving", RUB=10)
+        # Само удаление идёт в фоновом потоке после коммита; меряем постановку задачи
+        response = self.request(6, "delete", f"/api/v1/admin/user/{user.id}", self.admin, status=200, on_commit=False)
+        self.request(2, "get", f"/api/v1/admin/user/deletion/{response.json()['job_id']}", self.admin, status=200)
+
+    def test_delete_user_cancels_orders_per_ticker(self):
+        user = self.make_user("leaving", RUB=10 ** 6)
+        for ticker in ("AAA", "BBB"):
+            self.make_instrument(ticker)
+            LimitOrder.objects.bulk_create(
+                LimitOrder(user=user, ticker=ticker, direction="BUY", price_ticks=100 + i,
+                           original_qty=1, filled=0, status=OrderStatus.NEW)
+                for i in range(3)
+            )
+        job = UserDeletionJob.objects.create(user_id=user.id)
+        with self.settings(USER_DELETION_BATCH_PAUSE=0), mock.patch.object(marketdata, "changed") as changed:
+            run_deletion(job)
+        # Пачка снимается одним cancel_orders: по публикации на тикер, а не на ордер
+        self.assertEqual(sorted(call.args[0] for call in changed.call_args_list), ["AAA", "BBB"])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.cancelled_orders), (UserDeletionJob.DONE, 6))
+        self.assertFalse(LimitOrder.objects.filter(user_id=user.id).exists())
+
+    def test_profiles(self):
+        self.request(1, "get", "/api/v1/admin/profiles", self.admin, status=200)
+
+    def test_slow_request_gets_sampled_stacks(self):
+        def slow_list_profiles():
+            time.sleep(0.05)
+            return []
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING_SLOW_REQUEST_MS=10, PROFILING_DIR=directory, PROFILING_SAMPLE_INTERVAL_MS=1), \
+                mock.patch("admin_api.views.list_profiles", side_effect=slow_list_profiles):
+            response = self.client.get("/api/v1/admin/profiles", HTTP_AUTHORIZATION=f"TOKEN {self.admin.api_key}")
+            record = load_profile(response["X-Profile-Id"])
+        self.assertEqual(record["trigger"], "slow")
+        self.assertTrue(any("slow_list_profiles" in entry["stack"] for entry in record["stacks"]))
+
+    def test_api_profile_validates_host(self):
+        with self.settings(MIDDLEWARE=settings_api.MIDDLEWARE, ROOT_URLCONF=settings_api.ROOT_URLCONF):
+            self.assertEqual(self.client.get("/api/v1/instruments").status_code, 200)
+            self.assertEqual(self.client.get("/api/v1/instruments", HTTP_HOST="evil.example.com").status_code, 400)
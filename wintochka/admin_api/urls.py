@@ -1,16 +1,26 @@
 from django.urls import path
 from .views import (
     AdminDeleteUserView,
+    AdminUserDeletionStatusView,
     AdminBalanceDepositView,
     AdminBalanceWithdrawView,
+    AdminBalanceBulkDepositView,
+    AdminBalanceBulkWithdrawView,
     AdminInstrumentView,
     AdminDeleteInstrumentView,
+    AdminProfileListView,
+    AdminProfileDetailView,
 )
 
 urlpatterns = [
     path("api/v1/admin/user/<uuid:user_id>", AdminDeleteUserView.as_view()),
+    path("api/v1/admin/user/deletion/<uuid:job_id>", AdminUserDeletionStatusView.as_view()),
     path("api/v1/admin/balance/deposit", AdminBalanceDepositView.as_view()),
     path("api/v1/admin/balance/withdraw", AdminBalanceWithdrawView.as_view()),
+    path("api/v1/admin/balance/deposit/bulk", AdminBalanceBulkDepositView.as_view()),
+    path("api/v1/admin/balance/withdraw/bulk", AdminBalanceBulkWithdrawView.as_view()),
     path("api/v1/admin/instrument", AdminInstrumentView.as_view()),
     path("api/v1/admin/instrument/<str:ticker>", AdminDeleteInstrumentView.as_view()),
+    path("api/v1/admin/profiles", AdminProfileListView.as_view()),
+    path("api/v1/admin/profiles/<str:profile_id>", AdminProfileDetailView.as_view()),
 ]
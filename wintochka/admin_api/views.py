@@ -1,11 +1,17 @@
-from uuid import UUID
+from decimal import Decimal
+from uuid import UUID, uuid4
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, serializers
 from users.models import User
 from users.permissions import IsAdminAPIKey
 from django.shortcuts import get_object_or_404
-from balances.models import Balance
+from balances.bulk import deposit_rows, withdraw_rows
+from orders import marketdata
+from orders.delisting import delete_instrument
+from .deletion import start_user_deletion
+from .profiling import list_profiles, load_profile
+from .models import UserDeletionJob
 from instruments.models import Instrument
 from django.core.exceptions import ValidationError
 import re
@@ -33,52 +39,45 @@ class AdminDeleteUserView(APIView):
             "api_key": str(user.api_key)
         }
 
-        user.delete()
+        # Ордера и балансы удаляются в фоне пачками, см. admin_api/deletion.py
+        job = start_user_deletion(user)
+        data["job_id"] = str(job.id)
+        logger.info(f"User {user.id} scheduled for deletion, job {job.id}")
         return Response(data)
 
+
+class AdminUserDeletionStatusView(APIView):
+    permission_classes = [IsAdminAPIKey]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(UserDeletionJob, id=job_id)
+        return Response({
+            "job_id": str(job.id),
+            "user_id": str(job.user_id),
+            "status": job.status,
+            "stage": job.stage,
+            "cancelled_orders": job.cancelled_orders,
+            "deleted_rows": job.deleted_rows,
+            "error": job.error,
+        })
+
 class AdminBalanceDepositView(APIView):
     permission_classes = [IsAdminAPIKey]
 
     def post(self, request):
         data = request.data
-        logger.info(f"Admin deposit request received. Data: {data}")
         required_fields = {"user_id", "ticker", "amount"}
 
         if not required_fields.issubset(data):
             logger.error("Missing required fields in deposit request")
             return Response({"error": "Missing required fields"}, status=422)
 
-        try:
-            raw_user = data.get("user_id")
-            raw_ticker = data.get("ticker")
-            raw_amount = data.get("amount")
-            UUID(raw_user)
-            if not isinstance(raw_ticker, str):
-                raise ValueError()
-            amount = int(raw_amount)
-            if amount <= 0:
-                raise ValueError()
-            ticker = raw_ticker
-        except Exception as e:
-            logger.error(f"Invalid data in deposit request: {str(e)}")
-            return Response({"error": "Invalid user_id, ticker, or amount"}, status=422)
-
-        try:
-            user = User.objects.get(id=data["user_id"])
-            logger.info(f"User found: {user.id}")
-        except User.DoesNotExist:
-            logger.error(f"User not found: {data['user_id']}")
-            return Response({"error": "User not found"}, status=422)
-
-        balance, created = Balance.objects.get_or_create(user=user, ticker=ticker)
-        if created:
-            logger.info(f"New balance created for user {user.id}, ticker {ticker}")
-
-        logger.info(f"Depositing {amount} {ticker} to user {user.id}. Previous balance: {balance.amount}")
-        balance.amount += amount
-        balance.save()
-        logger.info(f"New balance after deposit: {balance.amount}")
+        applied, errors = deposit_rows([data])
+        if errors:
+            logger.error(f"Deposit rejected: {errors[0]['error']}")
+            return Response({"error": errors[0]["error"]}, status=422)
 
+        logger.info(f"Deposited {data['amount']} {data['ticker']} to user {data['user_id']}")
         return Response({"success": True})
 
 
@@ -87,56 +86,56 @@ class AdminBalanceWithdrawView(APIView):
 
     def post(self, request):
         data = request.data
-        logger.info(f"Admin withdrawal request received. Data: {data}")
         required_fields = {"user_id", "ticker", "amount"}
 
         if not required_fields.issubset(data):
             logger.error("Missing required fields in withdrawal request")
             return Response({"error": "Missing required fields"}, status=422)
 
-        try:
-            raw_user = data.get("user_id")
-            raw_ticker = data.get("ticker")
-            raw_amount = data.get("amount")
-            UUID(raw_user)
-            if not isinstance(raw_ticker, str):
-                raise ValueError()
-            amount = int(raw_amount)
-            if amount <= 0:
-                raise ValueError()
-            ticker = raw_ticker
-        except Exception as e:
-            logger.error(f"Invalid data in withdrawal request: {str(e)}")
-            return Response({"error": "Invalid user_id, ticker, or amount"}, status=422)
+        applied, errors = withdraw_rows([data])
+        if errors:
+            logger.error(f"Withdrawal rejected: {errors[0]['error']}")
+            return Response({"error": errors[0]["error"]}, status=422)
 
-        try:
-            user = User.objects.get(id=data["user_id"])
-            logger.info(f"User found: {user.id}")
-        except User.DoesNotExist:
-            logger.error(f"User not found: {data['user_id']}")
-            return Response({"error": "User not found"}, status=422)
+        logger.info(f"Withdrew {data['amount']} {data['ticker']} from user {data['user_id']}")
+        return Response({"success": True})
+
+
+class AdminBalanceBulkView(APIView):
+    """Пакетное зачисление/списание: {"rows": [{"user_id", "ticker", "amount"}, ...], "batch_id"?}"""
+    permission_classes = [IsAdminAPIKey]
+    apply_rows = None
+
+    def post(self, request):
+        rows = request.data.get("rows") if isinstance(request.data, dict) else None
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list in 'rows'"}, status=422)
+
+        # Повтор запроса с тем же batch_id не применяет строки второй раз
+        batch_id = request.data.get("batch_id") or uuid4().hex
+        if not isinstance(batch_id, str) or len(batch_id) > 64:
+            return Response({"error": "batch_id must be a string of at most 64 characters"}, status=422)
 
         try:
-            balance = Balance.objects.get(user=user, ticker=ticker)
-            logger.info(f"Balance found for user {user.id}, ticker {ticker}. Current amount: {balance.amount}")
-        except Balance.DoesNotExist:
-            logger.error(f"Balance not found for user {user.id}, ticker {ticker}")
-            return Response({"error": "Balance not found"}, status=422)
+            applied, errors = self.apply_rows(rows, batch_id=batch_id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=422)
+        logger.info(f"{type(self).__name__}: batch {batch_id} applied {applied} of {len(rows)} rows, {len(errors)} failed")
+        return Response({"batch_id": batch_id, "applied": applied, "failed": errors})
 
-        if balance.amount < amount:
-            logger.error(f"Insufficient funds. Requested: {amount}, available: {balance.amount}")
-            return Response({"error": "Insufficient funds"}, status=422)
 
-        logger.info(f"Withdrawing {amount} {ticker} from user {user.id}. Previous balance: {balance.amount}")
-        balance.amount -= amount
-        balance.save()
-        logger.info(f"New balance after withdrawal: {balance.amount}")
+class AdminBalanceBulkDepositView(AdminBalanceBulkView):
+    apply_rows = staticmethod(deposit_rows)
 
-        return Response({"success": True})
+
+class AdminBalanceBulkWithdrawView(AdminBalanceBulkView):
+    apply_rows = staticmethod(withdraw_rows)
 
 class InstrumentSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100)
     ticker = serializers.CharField(max_length=10)
+    tick_size = serializers.DecimalField(max_digits=20, decimal_places=4, required=False, default=Decimal("1"))
+    lot_size = serializers.IntegerField(min_value=1, required=False, default=1)
 
     def validate_ticker(self, value):
         """Кастомная валидация ticker согласно OpenAPI спецификации"""
@@ -146,6 +145,15 @@ class InstrumentSerializer(serializers.Serializer):
             )
         return value
 
+    def validate(self, attrs):
+        """Стоимость лота в один тик должна быть целой — иначе сделки не выражаются в целых RUB"""
+        if attrs["tick_size"] <= 0:
+            raise serializers.ValidationError({"tick_size": "Tick size must be positive"})
+        lot_value = attrs["lot_size"] * attrs["tick_size"]
+        if lot_value != lot_value.to_integral_value():
+            raise serializers.ValidationError("lot_size * tick_size must be a whole number")
+        return attrs
+
 class AdminInstrumentView(APIView):
     permission_classes = [IsAdminAPIKey]
 
@@ -184,7 +192,9 @@ class AdminInstrumentView(APIView):
         try:
             instrument = Instrument.objects.create(
                 name=serializer.validated_data['name'],
-                ticker=ticker
+                ticker=ticker,
+                tick_size=serializer.validated_data['tick_size'],
+                lot_size=serializer.validated_data['lot_size']
             )
             logger.info(f"Created instrument: {ticker}")
             return Response(
@@ -192,7 +202,9 @@ class AdminInstrumentView(APIView):
                     "success": True,
                     "instrument": {
                         "name": instrument.name,
-                        "ticker": instrument.ticker
+                        "ticker": instrument.ticker,
+                        "tick_size": str(instrument.tick_size),
+                        "lot_size": instrument.lot_size
                     }
                 },
                 status=status.HTTP_201_CREATED
@@ -221,10 +233,13 @@ class AdminDeleteInstrumentView(APIView):
 
         try:
             instrument = Instrument.objects.get(ticker=ticker)
-            instrument.delete()
-            logger.info(f"Deleted instrument: {ticker}")
+            # Сначала снимаем ордера с возвратом резервов, иначе средства
+            # по ордерам удалённого тикера останутся заблокированными
+            cancelled = delete_instrument(instrument)
+            marketdata.changed(ticker)
+            logger.info(f"Deleted instrument: {ticker}, cancelled {cancelled} orders")
             return Response(
-                {"success": True},
+                {"success": True, "cancelled_orders": cancelled},
                 status=status.HTTP_200_OK
             )
         except Instrument.DoesNotExist:
@@ -242,3 +257,21 @@ class AdminDeleteInstrumentView(APIView):
                 {"detail": "Internal server error"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class AdminProfileListView(APIView):
+    permission_classes = [IsAdminAPIKey]
+
+    def get(self, request):
+        """Сохранённые профили, новые первыми"""
+        return Response({"profiles": list_profiles()})
+
+
+class AdminProfileDetailView(APIView):
+    permission_classes = [IsAdminAPIKey]
+
+    def get(self, request, profile_id):
+        record = load_profile(profile_id)
+        if record is None:
+            return Response({"error": "Profile not found"}, status=404)
+        return Response(record)
@@ -0,0 +1,212 @@
+import logging
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from users.models import User
+from .models import Balance, ImportBatch, ImportedRow
+
+logger = logging.getLogger(__name__)
+
+# Пакетные зачисления/списания для админки и manage.py import_balances.
+# Все строки сначала валидируются, затем изменения применяются чанками:
+# одна транзакция на чанк и UPDATE amount = amount + delta (как F("amount") + delta)
+# через executemany, так что конкурентные операции с теми же балансами не теряют
+# обновлений. CASE-выражение через ORM на 100k строк упиралось в компиляцию запросов.
+#
+# Пакет — ImportBatch: номера применённых строк пишутся в ImportedRow в той же
+# транзакции, что и изменения балансов. Чанк, упавший на ошибке БД, откатывается
+# целиком, его строки возвращаются как NOT_APPLIED, а повторный запуск с тем же
+# batch_id применяет только их.
+
+CHUNK_SIZE = 500
+
+INVALID_ROW = "Invalid user_id, ticker, or amount"
+USER_NOT_FOUND = "User not found"
+BALANCE_NOT_FOUND = "Balance not found"
+INSUFFICIENT_FUNDS = "Insufficient funds"
+NOT_APPLIED = "Not applied due to a database error, retry with the same batch_id"
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _parse_amount(value):
+    """Целое количество; 12.9 из NDJSON — ошибка строки, а не молча 12"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError()
+    amount = Decimal(str(value).strip())
+    if not amount.is_finite() or amount != amount.to_integral_value():
+        raise ValueError()
+    return int(amount)
+
+
+def parse_rows(rows):
+    """Возвращает ([(index, user_id, ticker, amount)], [{"row", "error"}])"""
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            user_id = uuid.UUID(str(row["user_id"]))
+            ticker = row["ticker"]
+            if not isinstance(ticker, str) or not ticker:
+                raise ValueError()
+            amount = _parse_amount(row["amount"])
+            if amount <= 0:
+                raise ValueError()
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            errors.append({"row": index, "error": INVALID_ROW})
+            continue
+        valid.append((index, user_id, ticker, amount))
+    return valid, errors
+
+
+def _drop_unknown_users(valid, errors):
+    user_ids = list({user_id for _, user_id, _, _ in valid})
+    known = set()
+    for chunk in _chunks(user_ids, CHUNK_SIZE):
+        known.update(User.objects.filter(id__in=chunk).values_list("id", flat=True))
+
+    kept = []
+    for row in valid:
+        if row[1] in known:
+            kept.append(row)
+        else:
+            errors.append({"row": row[0], "error": USER_NOT_FOUND})
+    return kept
+
+
+def _balances_for(keys, lock=False):
+    """{(user_id, ticker): (balance_pk, amount)}"""
+    queryset = Balance.objects.filter(
+        user_id__in={user_id for user_id, _ in keys}, ticker__in={ticker for _, ticker in keys}
+    )
+    if lock:
+        queryset = queryset.select_for_update()
+    wanted = set(keys)
+    return {
+        (user_id, ticker): (pk, amount)
+        for pk, user_id, ticker, amount in queryset.values_list("id", "user_id", "ticker", "amount")
+        if (user_id, ticker) in wanted
+    }
+
+
+def _add_amounts(deltas):
+    """deltas: {balance_pk: signed delta}"""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {Balance._meta.db_table} SET amount = amount + %s WHERE id = %s",
+            [(delta, pk) for pk, delta in deltas.items()],
+        )
+
+
+def open_batch(batch_id, kind):
+    """ImportBatch для batch_id (None — новый пакет); ValueError, если id занят операцией другого вида"""
+    if batch_id is None:
+        return ImportBatch.objects.create(id=uuid.uuid4().hex, kind=kind)
+    batch, _ = ImportBatch.objects.get_or_create(id=batch_id, defaults={"kind": kind})
+    if batch.kind != kind:
+        raise ValueError(f"Batch {batch_id} is a {batch.kind}, not a {kind}")
+    return batch
+
+
+def _by_key(valid):
+    """{(user_id, ticker): [row, ...]} в порядке первого появления ключа"""
+    by_key = defaultdict(list)
+    for row in valid:
+        by_key[(row[1], row[2])].append(row)
+    return by_key
+
+
+def _apply_chunks(batch, by_key, chunk_size, apply_chunk, errors):
+    """apply_chunk([(key, rows)]) -> (индексы применённых строк, ошибки строк)"""
+    applied = 0
+    for chunk in _chunks(list(by_key.items()), chunk_size):
+        indexes = [row[0] for _, key_rows in chunk for row in key_rows]
+        try:
+            with transaction.atomic():
+                # Первой идёт запись: SQLite сразу берёт RESERVED-лок и ждёт его
+                # по busy timeout, а не падает при повышении лока после чтений
+                ImportBatch.objects.filter(pk=batch.pk).update(updated_at=timezone.now())
+                done = set(ImportedRow.objects.filter(
+                    batch=batch, row__gte=min(indexes), row__lte=max(indexes)
+                ).values_list("row", flat=True))
+                pending = [(key, [row for row in key_rows if row[0] not in done]) for key, key_rows in chunk]
+                new, chunk_errors = apply_chunk([(key, key_rows) for key, key_rows in pending if key_rows])
+                ImportedRow.objects.bulk_create(ImportedRow(batch=batch, row=index) for index in new)
+        except DatabaseError as e:
+            logger.error(f"Batch {batch.pk}: chunk of {len(indexes)} rows rolled back: {e}")
+            errors.extend({"row": index, "error": NOT_APPLIED} for index in indexes)
+            continue
+        applied += len(done.intersection(indexes)) + len(new)
+        errors.extend(chunk_errors)
+    return applied
+
+
+def deposit_rows(rows, chunk_size=CHUNK_SIZE, batch_id=None):
+    """Зачисляет строки {user_id, ticker, amount}. Возвращает (applied, errors)"""
+    valid, errors = parse_rows(rows)
+    valid = _drop_unknown_users(valid, errors)
+    batch = open_batch(batch_id, ImportBatch.DEPOSIT)
+
+    def deposit_chunk(chunk):
+        if chunk:
+            credit_totals({key: sum(row[3] for row in key_rows) for key, key_rows in chunk})
+        return [row[0] for _, key_rows in chunk for row in key_rows], []
+
+    applied = _apply_chunks(batch, _by_key(valid), chunk_size, deposit_chunk, errors)
+    return applied, sorted(errors, key=lambda e: e["row"])
+
+
+def credit_totals(totals):
+    """Зачисляет {(user_id, ticker): amount} одним executemany; вызывать внутри транзакции"""
+    keys = list(totals)
+    balances = _balances_for(keys)
+    missing = [key for key in keys if key not in balances]
+    if missing:
+        # Создаём нулевые балансы и зачисляем через тот же UPDATE:
+        # если строку параллельно создал кто-то ещё, зачисление не потеряется
+        Balance.objects.bulk_create(
+            [Balance(user_id=user_id, ticker=ticker, amount=0) for user_id, ticker in missing],
+            ignore_conflicts=True,
+        )
+        balances = _balances_for(keys)
+    _add_amounts({balances[key][0]: amount for key, amount in totals.items()})
+
+
+def withdraw_rows(rows, chunk_size=CHUNK_SIZE, batch_id=None):
+    """Списывает строки; строка, уводящая баланс в минус, отклоняется целиком"""
+    valid, errors = parse_rows(rows)
+    valid = _drop_unknown_users(valid, errors)
+    batch = open_batch(batch_id, ImportBatch.WITHDRAW)
+
+    def withdraw_chunk(chunk):
+        if not chunk:
+            return [], []
+        balances = _balances_for([key for key, _ in chunk], lock=True)
+        applied, chunk_errors, deltas = [], [], {}
+        for key, key_rows in chunk:
+            balance = balances.get(key)
+            if balance is None:
+                chunk_errors.extend({"row": index, "error": BALANCE_NOT_FOUND} for index, _, _, _ in key_rows)
+                continue
+            pk, available = balance
+            debit = 0
+            for index, _, _, amount in key_rows:
+                if available - debit < amount:
+                    chunk_errors.append({"row": index, "error": INSUFFICIENT_FUNDS})
+                else:
+                    debit += amount
+                    applied.append(index)
+            if debit:
+                deltas[pk] = -debit
+        if deltas:
+            _add_amounts(deltas)
+        return applied, chunk_errors
+
+    applied = _apply_chunks(batch, _by_key(valid), chunk_size, withdraw_chunk, errors)
+    return applied, sorted(errors, key=lambda e: e["row"])
@@ -0,0 +1,54 @@
+import csv
+import hashlib
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from balances.bulk import deposit_rows, withdraw_rows
+
+
+class Command(BaseCommand):
+    help = "Массовое зачисление/списание из CSV (user_id,ticker,amount) или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="По умолчанию — по расширению файла")
+        parser.add_argument("--withdraw", action="store_true", help="Списывать вместо зачисления")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--batch-id",
+            help="Id пакета; по умолчанию — хэш файла, так что повторный запуск применяет только непрошедшие строки",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            text = content.decode()
+            if fmt == "csv":
+                rows = list(csv.DictReader(io.StringIO(text, newline="")))
+            else:
+                rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        kind = "withdraw" if options["withdraw"] else "deposit"
+        batch_id = options["batch_id"] or f"{kind}-{hashlib.sha256(content).hexdigest()[:48]}"
+
+        started = time.perf_counter()
+        apply_rows = withdraw_rows if options["withdraw"] else deposit_rows
+        try:
+            applied, errors = apply_rows(rows, chunk_size=options["chunk_size"], batch_id=batch_id)
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for error in errors:
+            # Номер строки файла: +1 за заголовок CSV и +1 за нумерацию с единицы
+            line = error["row"] + (2 if fmt == "csv" else 1)
+            self.stderr.write(f"line {line}: {error['error']}")
+        self.stdout.write(f"Batch {batch_id}: applied {applied} of {len(rows)} rows in {elapsed:.2f}s, {len(errors)} failed")
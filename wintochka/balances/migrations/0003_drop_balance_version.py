@@ -0,0 +1,16 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('balances', '0002_balance_version'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BalanceVersion',
+        ),
+    ]
@@ -12,3 +12,25 @@ class Balance(models.Model):
 
     def __str__(self):
         return f"{self.user.name} — {self.ticker}: {self.amount}"
+
+
+
+class ImportBatch(models.Model):
+    """Пакетная операция с балансами (balances/bulk.py): повторный запуск с тем же
+    id пропускает строки, уже применённые в прошлый раз"""
+    DEPOSIT = "deposit"
+    WITHDRAW = "withdraw"
+
+    id = models.CharField(max_length=64, primary_key=True)
+    kind = models.CharField(max_length=8, choices=[(DEPOSIT, DEPOSIT), (WITHDRAW, WITHDRAW)])
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ImportedRow(models.Model):
+    """Строка пакета, уже применённая к балансам; пишется в транзакции её чанка"""
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE)
+    row = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('batch', 'row')
@@ -1,3 +1,69 @@
-from django.test import TestCase
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from balances import bulk
+from balances.bulk import NOT_APPLIED, deposit_rows, parse_rows, withdraw_rows
+from balances.models import Balance
+from wintochka.testing import QueryBudgetTestCase
+
+
+class BalanceQueryBudgetTest(QueryBudgetTestCase):
+    def test_balance(self):
+        def balance(size):
+            user = self.make_user(f"holder{size}", **{f"T{size}N{i}": i + 1 for i in range(size)})
+            queries = self.capture("get", "/api/v1/balance", user, status=200)
+            self.assertEqual(len(queries.response.json()), size)
+            return queries
+
+        self.assertScales(balance, base=2)
+
+
+class ParseRowsTest(SimpleTestCase):
+    def test_rejects_fractional_amounts(self):
+        user_id = str(uuid.uuid4())
+        valid, errors = parse_rows([
+            {"user_id": user_id, "ticker": "RUB", "amount": amount} for amount in (12, "12", 12.0, 12.9, "12.9", True)
+        ])
+        self.assertEqual([row[3] for row in valid], [12, 12, 12])
+        self.assertEqual([error["row"] for error in errors], [3, 4, 5])
+
+
+class BulkBatchTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [self.make_user(f"holder{i}", RUB=100) for i in range(3)]
+        self.rows = [{"user_id": str(user.id), "ticker": "RUB", "amount": 10} for user in self.users]
+
+    def amounts(self):
+        return [Balance.objects.get(user=user, ticker="RUB").amount for user in self.users]
+
+    def test_rerun_applies_rows_once(self):
+        self.assertEqual(deposit_rows(self.rows, batch_id="daily"), (3, []))
+        self.assertEqual(deposit_rows(self.rows, batch_id="daily"), (3, []))
+        self.assertEqual(self.amounts(), [110, 110, 110])
+        with self.assertRaises(ValueError):
+            withdraw_rows(self.rows, batch_id="daily")
+
+    def test_failed_chunk_is_reported_and_retried(self):
+        add_amounts = bulk._add_amounts
+        calls = []
+
+        def locked_second_chunk(deltas):
+            calls.append(deltas)
+            if len(calls) == 2:
+                raise OperationalError("database is locked")
+            add_amounts(deltas)
+
+        with mock.patch.object(bulk, "_add_amounts", side_effect=locked_second_chunk):
+            applied, errors = deposit_rows(self.rows, chunk_size=1, batch_id="daily")
+        self.assertEqual(applied, 2)
+        self.assertEqual(errors, [{"row": 1, "error": NOT_APPLIED}])
+        self.assertEqual(self.amounts(), [110, 100, 110])
+
+        with mock.patch.object(bulk, "_add_amounts", wraps=add_amounts) as retried:
+            self.assertEqual(deposit_rows(self.rows, chunk_size=1, batch_id="daily"), (3, []))
+        self.assertEqual(retried.call_count, 1)
+        self.assertEqual(self.amounts(), [110, 110, 110])
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:17
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instrument',
+            name='lot_size',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='instrument',
+            name='tick_size',
+            field=models.DecimalField(decimal_places=4, default=Decimal('1'), max_digits=20),
+        ),
+    ]
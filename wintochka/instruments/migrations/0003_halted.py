@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0002_tick_and_lot_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instrument',
+            name='halted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
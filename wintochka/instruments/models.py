@@ -1,8 +1,41 @@
+from decimal import Decimal
 from django.db import models
 
 class Instrument(models.Model):
     name = models.CharField(max_length=100)
     ticker = models.CharField(max_length=10, unique=True)
+    # Цена ордера — целое число тиков, количество — кратно лоту.
+    # lot_size * tick_size обязан быть целым: тогда стоимость любой сделки
+    # выражается целым числом единиц баланса RUB без округлений.
+    tick_size = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal("1"))
+    lot_size = models.PositiveIntegerField(default=1)
+    # Торги остановлены (идёт делистинг): новые ордера не принимаются
+    halted = models.BooleanField(default=False)
 
     def __str__(self):
         return f"{self.ticker} ({self.name})"
+
+    def to_ticks(self, price):
+        ticks = Decimal(price) / self.tick_size
+        if ticks != ticks.to_integral_value():
+            raise ValueError(f"Price {price} is not a multiple of tick size {self.tick_size}")
+        return int(ticks)
+
+    def from_ticks(self, ticks):
+        return ticks * self.tick_size
+
+    def notional(self, qty, price_ticks):
+        """Стоимость qty по цене price_ticks в единицах RUB, без округления"""
+        return self.ticks_value(qty * price_ticks)
+
+    def ticks_value(self, qty_ticks):
+        """Сумма количество * тики в единицах RUB; дробная сумма — ValueError.
+
+        При количестве, кратном лоту, и целом lot_size * tick_size сумма
+        всегда целая; дробь значит, что инструмент или ордер настроены неверно,
+        и молча округлять её — терять деньги на резерве.
+        """
+        value = qty_ticks * self.tick_size
+        if value != value.to_integral_value():
+            raise ValueError(f"{qty_ticks} lot-ticks of {self.ticker} cost {value}, not a whole number of RUB")
+        return int(value)
@@ -0,0 +1,82 @@
+import logging
+
+from django.db import transaction
+
+from .models import (
+    ArchivedOrder,
+    ArchivedTransaction,
+    LimitOrder,
+    MarketOrder,
+    OrderStatus,
+    PendingMatch,
+    Transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+# Перенос ордеров в терминальном состоянии и старых сделок из горячих таблиц,
+# по которым ходят матчинг и стакан, в холодные Archived*-таблицы. Каждая пачка
+# копируется и удаляется в одной транзакции; повторный запуск безопасен
+# (ignore_conflicts), поэтому прерванный проход можно просто перезапустить.
+
+
+def _limit_to_archived(order):
+    return ArchivedOrder(
+        id=order.id, order_type=ArchivedOrder.LIMIT, user_id=order.user_id, ticker=order.ticker,
+        direction=order.direction, price_ticks=order.price_ticks, qty=order.original_qty,
+        filled=order.filled, status=order.status, created_at=order.created_at, seq=order.seq,
+    )
+
+
+def _market_to_archived(order):
+    return ArchivedOrder(
+        id=order.id, order_type=ArchivedOrder.MARKET, user_id=order.user_id, ticker=order.ticker,
+        direction=order.direction, price_ticks=None, qty=order.qty,
+        filled=order.filled, status=order.status, created_at=order.created_at, seq=order.seq,
+    )
+
+
+def _transaction_to_archived(trade):
+    return ArchivedTransaction(
+        id=trade.id, seq=trade.seq, ticker=trade.ticker, amount=trade.amount,
+        price_ticks=trade.price_ticks, timestamp=trade.timestamp,
+        maker_order_id=trade.maker_order_id, taker_order_id=trade.taker_order_id,
+        maker_user_id=trade.maker_user_id, taker_user_id=trade.taker_user_id,
+    )
+
+
+def _move(queryset, to_archived, archived_model, batch_size):
+    # Курсор по pk: каждая пачка продолжает обход с места предыдущей, а не
+    # пересматривает с начала таблицы оставшиеся в ней неподходящие строки
+    moved, last_pk = 0, None
+    while True:
+        with transaction.atomic():
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch.order_by("pk")[:batch_size])
+            if not rows:
+                return moved
+            archived_model.objects.bulk_create([to_archived(row) for row in rows], ignore_conflicts=True)
+            queryset.model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        moved += len(rows)
+        last_pk = rows[-1].pk
+
+
+def archive_before(cutoff, batch_size=500):
+    """Архивирует всё терминальное, созданное раньше cutoff. Возвращает счётчики по таблицам"""
+    # Рыночный ордер не ложится в стакан: после матчинга он терминален при любом статусе
+    market_orders = MarketOrder.objects.filter(created_at__lt=cutoff).exclude(
+        id__in=PendingMatch.objects.values("order_id")
+    )
+    moved = {
+        "limit_orders": _move(
+            LimitOrder.objects.filter(created_at__lt=cutoff, status__in=OrderStatus.TERMINAL),
+            _limit_to_archived, ArchivedOrder, batch_size,
+        ),
+        "market_orders": _move(market_orders, _market_to_archived, ArchivedOrder, batch_size),
+        "transactions": _move(
+            Transaction.objects.filter(timestamp__lt=cutoff),
+            _transaction_to_archived, ArchivedTransaction, batch_size,
+        ),
+    }
+    logger.info(f"Archived before {cutoff.isoformat()}: {moved}")
+    return moved
@@ -0,0 +1,69 @@
+import logging
+
+from django.db import transaction
+
+from .engine import OrderMatchingEngine
+from .models import LimitOrder, MarketOrder, OrderStatus, PendingMatch
+
+logger = logging.getLogger(__name__)
+
+# Делистинг: тикер останавливается (Instrument.halted), затем все открытые
+# ордера снимаются пачками фиксированного размера. На пачку — одна транзакция
+# и OrderMatchingEngine.cancel_orders: один сгруппированный запрос возвратов,
+# один UPDATE ордеров, один executemany зачислений.
+# Время транзакции не зависит от размера стакана, а прерванный делистинг
+# продолжается повторным вызовом. Ордер, прошедший проверку halted до
+# остановки, снимает последний проход в транзакции удаления инструмента.
+
+
+def _cancel_queued(ticker):
+    # Первым в транзакции идёт запись (см. intake.match_batch). Рыночные ордера
+    # ничего не резервируют: достаточно снять их с очереди
+    queued = PendingMatch.objects.filter(ticker=ticker)
+    MarketOrder.objects.filter(
+        id__in=queued.filter(order_type=PendingMatch.MARKET).values("order_id"), status__in=OrderStatus.OPEN
+    ).update(status=OrderStatus.CANCELLED)
+    queued.delete()
+
+
+def _cancel_chunk(instrument, chunk_size):
+    with transaction.atomic():
+        _cancel_queued(instrument.ticker)
+        ids = list(
+            LimitOrder.objects.filter(ticker=instrument.ticker, status__in=OrderStatus.OPEN)
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return 0
+        return OrderMatchingEngine.cancel_orders(ids, {instrument.ticker: instrument})
+
+
+def _cancel_all(instrument, chunk_size):
+    cancelled = 0
+    while True:
+        done = _cancel_chunk(instrument, chunk_size)
+        if not done:
+            return cancelled
+        cancelled += done
+
+
+def delist(instrument, chunk_size=500):
+    """Останавливает торги по инструменту и снимает все его ордера. Возвращает число снятых лимитных"""
+    if not instrument.halted:
+        instrument.halted = True
+        instrument.save(update_fields=["halted"])
+
+    cancelled = _cancel_all(instrument, chunk_size)
+    logger.info(f"Delisted {instrument.ticker}: cancelled {cancelled} limit orders")
+    return cancelled
+
+
+def delete_instrument(instrument, chunk_size=500):
+    """Делистинг и удаление инструмента. Возвращает число снятых лимитных ордеров"""
+    cancelled = delist(instrument, chunk_size)
+    with transaction.atomic():
+        # Последний проход — в одной транзакции с удалением: после неё у
+        # инструмента не останется открытых ордеров, которые нечем вернуть
+        cancelled += _cancel_all(instrument, chunk_size)
+        instrument.delete()
+    return cancelled
@@ -0,0 +1,129 @@
+import json
+from django.http import HttpResponse
+
+# Быстрый путь сериализации для горячих read-эндпоинтов: строки JSON собираются
+# напрямую из кортежей values_list(), без DRF-сериализаторов и JSONRenderer.
+# Цены приходят целыми тиками и переводятся в десятичные только здесь.
+# Формат вывода совпадает с тем, что отдавал DRF (compact JSON, UTF-8,
+# цена в стакане — строка с 4 знаками после запятой, цена сделки — JSON-число).
+
+_encode_str = json.JSONEncoder(ensure_ascii=False).encode
+
+PRICE_FORMAT = ".4f"
+
+
+def format_price(price):
+    return format(price, PRICE_FORMAT)
+
+
+def format_price_number(price):
+    """Точная десятичная запись без потерь на float: 100.5000 -> 100.5, 100 -> 100.0"""
+    whole, _, frac = format(price, PRICE_FORMAT).partition(".")
+    return "%s.%s" % (whole, frac.rstrip("0") or "0")
+
+
+def _encode_level(ticks, qty, tick_size):
+    return '{"price":"%s","qty":%d}' % (format_price(ticks * tick_size), qty)
+
+
+def _encode_levels(levels, tick_size):
+    return ",".join(_encode_level(ticks, qty, tick_size) for ticks, qty in levels)
+
+
+def encode_orderbook_levels(levels, tick_size):
+    """Уровни стакана по отдельности — marketdata склеивает из них ответ любой глубины"""
+    return [_encode_level(ticks, qty, tick_size).encode() for ticks, qty in levels]
+
+
+def encode_orderbook(bids, asks, tick_size):
+    """bids/asks — итерируемые пары (price_ticks, qty)"""
+    return ('{"bids":[%s],"asks":[%s]}' % (_encode_levels(bids, tick_size), _encode_levels(asks, tick_size))).encode()
+
+
+def _int_or_null(value):
+    return "null" if value is None else "%d" % value
+
+
+def _encode_transaction(ticker, amount, ticks, timestamp, seq, tick_size):
+    return '{"ticker":%s,"amount":%d,"price":%s,"timestamp":"%s","seq":%s}' % (
+        _encode_str(ticker), amount, format_price_number(ticks * tick_size), timestamp.isoformat(), _int_or_null(seq)
+    )
+
+
+def encode_transactions(rows, tick_size):
+    """rows — кортежи (ticker, amount, price_ticks, timestamp, seq)"""
+    return ("[%s]" % ",".join(_encode_transaction(*row, tick_size) for row in rows)).encode()
+
+
+def encode_transaction_items(rows, tick_size):
+    """Сделки по отдельности, как encode_orderbook_levels"""
+    return [_encode_transaction(*row, tick_size).encode() for row in rows]
+
+
+def encode_instruments(rows):
+    """rows — кортежи (ticker, name, tick_size, lot_size)"""
+    return ("[%s]" % ",".join(
+        '{"ticker":%s,"name":%s,"tick_size":"%s","lot_size":%d}'
+        % (_encode_str(ticker), _encode_str(name), format_price(tick_size), lot_size)
+        for ticker, name, tick_size, lot_size in rows
+    )).encode()
+
+
+def encode_balances(rows):
+    """rows — кортежи (ticker, amount)"""
+    return ("{%s}" % ",".join(
+        "%s:%d" % (_encode_str(ticker), amount) for ticker, amount in rows
+    )).encode()
+
+
+def encode_balances_detailed(rows):
+    """rows — кортежи (ticker, amount, blocked)"""
+    return ("{%s}" % ",".join(
+        '%s:{"amount":%d,"blocked":%d}' % (_encode_str(ticker), amount, blocked)
+        for ticker, amount, blocked in rows
+    )).encode()
+
+
+def _price_or_null(ticks, tick_size):
+    return "null" if ticks is None else format_price_number(ticks * tick_size)
+
+
+def encode_ticker_stats(rows):
+    """rows — кортежи (ticker, tick_size, summary или None, best_bid, best_ask) в тиках"""
+    parts = []
+    for ticker, tick_size, summary, best_bid, best_ask in rows:
+        summary = summary or {}
+        parts.append(
+            '{"ticker":%s,"last_price":%s,"open_24h":%s,"high_24h":%s,"low_24h":%s,'
+            '"volume_24h":%d,"trades_24h":%d,"best_bid":%s,"best_ask":%s}' % (
+                _encode_str(ticker),
+                _price_or_null(summary.get("last"), tick_size),
+                _price_or_null(summary.get("open"), tick_size),
+                _price_or_null(summary.get("high"), tick_size),
+                _price_or_null(summary.get("low"), tick_size),
+                summary.get("volume", 0),
+                summary.get("trades", 0),
+                _price_or_null(best_bid, tick_size),
+                _price_or_null(best_ask, tick_size),
+            )
+        )
+    return ("[%s]" % ",".join(parts)).encode()
+
+
+def encode_executions(rows, tick_sizes):
+    """rows — кортежи (seq, trade_id, order_id, ticker, direction, liquidity, qty, price_ticks, timestamp)"""
+    return ("[%s]" % ",".join(
+        '{"seq":%d,"trade_id":%d,"order_id":"%s","ticker":%s,"direction":"%s","liquidity":"%s",'
+        '"qty":%d,"price":%s,"timestamp":"%s"}' % (
+            seq, trade_id, order_id, _encode_str(ticker), direction, liquidity, qty,
+            _price_or_null(ticks if ticker in tick_sizes else None, tick_sizes.get(ticker)),
+            timestamp.isoformat(),
+        )
+        for seq, trade_id, order_id, ticker, direction, liquidity, qty, ticks, timestamp in rows
+    )).encode()
+
+
+class JSONBytesResponse(HttpResponse):
+    def __init__(self, content=b"", status=200, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content, status=status, **kwargs)
@@ -0,0 +1,191 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from rest_framework.exceptions import ValidationError
+
+from .models import EventSequence, MarketOrder, LimitOrder, OrderStatus, Transaction, Execution, PendingMatch
+from . import marketdata
+from balances.bulk import credit_totals
+from balances.models import Balance
+from instruments.models import Instrument
+
+logger = logging.getLogger(__name__)
+
+class OrderMatchingEngine:
+    @staticmethod
+    def execute_trade(buy_order, sell_order, qty, price_ticks, instrument, taker_order, seq=None):
+        """Сделка по цене price_ticks (тики instrument); taker_order — входящий ордер.
+
+        seq — заранее зарезервированный номер сделки (EventSequence.block).
+
+        Лимитные ордера зарезервировали средства при создании: RUB покупателя
+        по его лимитной цене, актив продавца — целиком. С них повторно не
+        списываем; покупателю возвращается разница между лимитом и ценой сделки.
+        Рыночные ордера ничего не резервируют и списываются здесь с проверкой.
+        """
+        with transaction.atomic():
+            cost = instrument.notional(qty, price_ticks)
+
+            if isinstance(buy_order, LimitOrder):
+                refund = instrument.notional(qty, buy_order.price_ticks) - cost
+                if refund:
+                    Balance.objects.filter(user_id=buy_order.user_id, ticker="RUB").update(amount=F("amount") + refund)
+            else:
+                buyer_rub = Balance.objects.select_for_update().filter(user_id=buy_order.user_id, ticker="RUB").first()
+                if buyer_rub is None or buyer_rub.amount < cost:
+                    raise ValidationError("Недостаточно средств у покупателя")
+                buyer_rub.amount -= cost
+                buyer_rub.save(update_fields=["amount"])
+
+            if not isinstance(sell_order, LimitOrder):
+                seller_asset = Balance.objects.select_for_update().filter(user_id=sell_order.user_id, ticker=sell_order.ticker).first()
+                if seller_asset is None or seller_asset.amount < qty:
+                    raise ValidationError("Недостаточно активов у продавца")
+                seller_asset.amount -= qty
+                seller_asset.save(update_fields=["amount"])
+
+            seller_rub, _ = Balance.objects.get_or_create(user_id=sell_order.user_id, ticker="RUB")
+            buyer_asset, _ = Balance.objects.get_or_create(user_id=buy_order.user_id, ticker=sell_order.ticker)
+            Balance.objects.filter(pk=seller_rub.pk).update(amount=F("amount") + cost)
+            Balance.objects.filter(pk=buyer_asset.pk).update(amount=F("amount") + qty)
+
+            maker_order = sell_order if taker_order is buy_order else buy_order
+            trade = Transaction.objects.create(
+                seq=seq, ticker=sell_order.ticker, amount=qty, price_ticks=price_ticks,
+                maker_order_id=maker_order.id, taker_order_id=taker_order.id,
+                maker_user_id=maker_order.user_id, taker_user_id=taker_order.user_id,
+            )
+            Execution.objects.bulk_create([
+                Execution(
+                    user_id=order.user_id, trade_id=trade.id, order_id=order.id, ticker=trade.ticker,
+                    direction=order.direction, liquidity=liquidity, qty=qty, price_ticks=price_ticks,
+                    timestamp=trade.timestamp, seq=trade.seq,
+                )
+                for order, liquidity in ((maker_order, Execution.MAKER), (taker_order, Execution.TAKER))
+            ])
+
+            logger.info(f"Trade executed: {qty} {sell_order.ticker} @ {price_ticks} ticks | buyer={buy_order.user_id}, seller={sell_order.user_id}")
+
+    @staticmethod
+    def cancel_order(order, instrument=None):
+        """Снимает открытый лимитный ордер и возвращает зарезервированный остаток.
+
+        Возвращает False, если ордер к моменту блокировки уже не открыт.
+        """
+        with transaction.atomic():
+            order = LimitOrder.objects.select_for_update().get(pk=order.pk)
+            if order.status not in OrderStatus.OPEN:
+                return False
+
+            remaining = order.original_qty - order.filled
+            if order.direction == "BUY":
+                instrument = instrument or Instrument.objects.get(ticker=order.ticker)
+                refund = instrument.notional(remaining, order.price_ticks)
+                Balance.objects.filter(user_id=order.user_id, ticker="RUB").update(amount=F("amount") + refund)
+            else:
+                Balance.objects.filter(user_id=order.user_id, ticker=order.ticker).update(amount=F("amount") + remaining)
+
+            order.status = OrderStatus.CANCELLED
+            order.save(update_fields=["status"])
+            PendingMatch.objects.filter(order_id=order.id).delete()
+            marketdata.changed(order.ticker)
+            logger.info(f"Order {order.id} cancelled")
+            return True
+
+    @staticmethod
+    def cancel_orders(order_ids, instruments=None):
+        """Снимает пачку лимитных ордеров с возвратом резервов; вызывать в транзакции.
+
+        Один сгруппированный запрос считает возвраты по (пользователь, актив),
+        один UPDATE снимает ордера, один executemany зачисляет возвраты, и
+        стакан каждого тикера публикуется один раз. Уже не открытые ордера
+        пропускаются; записи PendingMatch снимает вызывающий. instruments —
+        {ticker: Instrument}, если уже загружены. Возвращает число снятых.
+        """
+        orders = LimitOrder.objects.filter(id__in=order_ids, status__in=OrderStatus.OPEN)
+        remaining = F("original_qty") - F("filled")
+        reserved = list(
+            orders.values("user_id", "ticker", "direction")
+            .annotate(qty=Sum(remaining), qty_ticks=Sum(remaining * F("price_ticks")))
+        )
+        tickers = {row["ticker"] for row in reserved}
+        if instruments is None:
+            instruments = {i.ticker: i for i in Instrument.objects.filter(ticker__in=tickers)}
+
+        refunds = defaultdict(int)
+        for row in reserved:
+            if row["direction"] == "BUY":
+                refunds[(row["user_id"], "RUB")] += instruments[row["ticker"]].ticks_value(row["qty_ticks"])
+            else:
+                refunds[(row["user_id"], row["ticker"])] += row["qty"]
+
+        cancelled = orders.update(status=OrderStatus.CANCELLED)
+        credit_totals({key: amount for key, amount in refunds.items() if amount})
+        for ticker in tickers:
+            marketdata.changed(ticker)
+        return cancelled
+
+    @staticmethod
+    def match_order(order, instrument=None):
+        logger.info(f"Matching started for order {order.id}")
+        if instrument is None:
+            instrument = Instrument.objects.get(ticker=order.ticker)
+
+        if isinstance(order, MarketOrder):
+            if order.direction == "BUY":
+                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="SELL", status__in=OrderStatus.OPEN).order_by("price_ticks", "seq")
+            else:
+                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="BUY", status__in=OrderStatus.OPEN).order_by("-price_ticks", "seq")
+        else:
+            if order.direction == "BUY":
+                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="SELL", status__in=OrderStatus.OPEN, price_ticks__lte=order.price_ticks).order_by("price_ticks", "seq")
+            else:
+                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="BUY", status__in=OrderStatus.OPEN, price_ticks__gte=order.price_ticks).order_by("-price_ticks", "seq")
+
+        total_filled = 0
+        # Номера сделок резервируются пачками в транзакции вызывающего, вне
+        # savepoint'а execute_trade: отказ сделки оставляет дыру, а не повтор
+        seqs = EventSequence.block()
+
+        for counter_order in counter_orders:
+            if order.filled >= order.original_qty:
+                break
+
+            fillable = min(order.original_qty - order.filled, counter_order.original_qty - counter_order.filled)
+            if fillable <= 0:
+                continue
+
+            try:
+                OrderMatchingEngine.execute_trade(
+                    buy_order=order if order.direction == "BUY" else counter_order,
+                    sell_order=counter_order if order.direction == "BUY" else order,
+                    qty=fillable,
+                    price_ticks=counter_order.price_ticks,
+                    instrument=instrument,
+                    taker_order=order,
+                    seq=next(seqs),
+                )
+
+                order.filled += fillable
+                counter_order.filled += fillable
+
+                counter_order.status = "EXECUTED" if counter_order.filled == counter_order.original_qty else "PARTIALLY_EXECUTED"
+                counter_order.save(update_fields=["filled", "status"])
+                total_filled += fillable
+
+            except ValidationError as e:
+                logger.warning(f"Skipping trade due to: {str(e)}")
+                continue
+
+        order.status = (
+            "EXECUTED" if order.filled == order.original_qty
+            else "PARTIALLY_EXECUTED" if order.filled > 0 else "NEW"
+        )
+        order.save(update_fields=["filled", "status"])
+        # Новый уровень в стакане или сделки — в любом случае снимок устарел
+        marketdata.changed(order.ticker)
+
+        logger.info(f"Matching finished for order {order.id}: filled={order.filled}, status={order.status}")
+        return total_filled
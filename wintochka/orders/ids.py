@@ -0,0 +1,25 @@
+import os
+import threading
+import time
+import uuid
+
+# Идентификаторы ордеров в духе UUIDv7: 48 бит unix-времени в миллисекундах,
+# версия, 12 бит счётчика внутри миллисекунды, вариант и 62 случайных бита.
+# Значения растут со временем (в пределах процесса — строго), поэтому вставки
+# идут в конец B-дерева первичного ключа, а сортировка по id — это сортировка
+# по времени создания.
+
+_lock = threading.Lock()
+_last = 0
+
+
+def uuid7():
+    global _last
+    with _lock:
+        # Старшие 48 бит — миллисекунды, младшие 12 — счётчик. Если часы
+        # пошли назад или счётчик переполнился, продолжаем от последнего значения
+        stamp = max(time.time_ns() // 1_000_000 << 12, _last + 1)
+        _last = stamp
+    rand = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(int=(stamp >> 12) << 80 | 0x7 << 76 | (stamp & 0xFFF) << 64 | 0b10 << 62 | rand)
+
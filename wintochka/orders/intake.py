@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from . import marketdata
+from .engine import OrderMatchingEngine
+from .models import LimitOrder, MarketOrder, OrderStatus, PendingMatch
+
+logger = logging.getLogger(__name__)
+
+# Async-приём ордеров: view резервирует средства, сохраняет ордер и кладёт его
+# в PendingMatch; пул воркеров (manage.py run_matching) разбирает очередь
+# пачками по тикеру, по одной транзакции на пачку. Ошибка блокировки БД
+# оставляет записи в очереди; ордер, который матчинг отвергает по другой
+# причине, снимается с возвратом резерва.
+
+def is_async():
+    return settings.ORDER_INTAKE_MODE == "async"
+
+
+def enqueue(order):
+    order_type = PendingMatch.LIMIT if isinstance(order, LimitOrder) else PendingMatch.MARKET
+    PendingMatch.objects.create(order_id=order.id, order_type=order_type, ticker=order.ticker)
+    if order_type == PendingMatch.LIMIT:
+        # Лимитный ордер виден в стакане ещё до матчинга
+        marketdata.changed(order.ticker)
+
+
+def queue_depth():
+    return PendingMatch.objects.count()
+
+
+def _match_entry(entry):
+    model = LimitOrder if entry.order_type == PendingMatch.LIMIT else MarketOrder
+    # Ордер мог быть исполнен как встречный предыдущим ордером той же пачки
+    # или отменён, пока лежал в очереди, поэтому читаем его заново
+    order = model.objects.filter(id=entry.order_id).first()
+    if order is None or order.status not in OrderStatus.OPEN or order.filled >= order.original_qty:
+        return
+    OrderMatchingEngine.match_order(order)
+
+
+def match_batch(entries):
+    try:
+        with transaction.atomic():
+            # Первым в транзакции идёт запись: SQLite сразу берёт RESERVED-лок и
+            # ждёт его по busy timeout, а не падает с "database is locked" при
+            # попытке повысить лок после чтений
+            PendingMatch.objects.filter(id__in=[e.id for e in entries]).delete()
+            for entry in entries:
+                _match_entry(entry)
+        return
+    except OperationalError:
+        # "database is locked" и т.п. — пачка остаётся в очереди целиком
+        raise
+    except Exception as e:
+        logger.error(f"Batch of {len(entries)} orders failed ({e}), retrying one by one")
+
+    for entry in entries:
+        try:
+            with transaction.atomic():
+                PendingMatch.objects.filter(id=entry.id).delete()
+                _match_entry(entry)
+        except OperationalError:
+            # Запись осталась в очереди (удаление откатилось) вместе с
+            # остальными; пул отложит пачку и вернётся к ним
+            raise
+        except Exception as e:
+            logger.error(f"Matching failed for order {entry.order_id}, rejecting it: {e}")
+            _reject(entry)
+
+
+def _reject(entry):
+    """Снимает ордер, который не удаётся сматчить, и возвращает резерв.
+
+    Просто выкинуть запись из очереди нельзя: ордер остался бы NEW с
+    зарезервированными средствами навсегда.
+    """
+    with transaction.atomic():
+        PendingMatch.objects.filter(id=entry.id).delete()
+        if entry.order_type == PendingMatch.LIMIT:
+            order = LimitOrder.objects.filter(id=entry.order_id).first()
+            if order is not None:
+                OrderMatchingEngine.cancel_order(order)
+        else:
+            # Рыночный ордер ничего не резервирует: исполненное остаётся исполненным
+            MarketOrder.objects.filter(id=entry.order_id, status__in=OrderStatus.OPEN).update(status=OrderStatus.CANCELLED)
+
+
+class MatchingWorkerPool:
+    """Потоки разбирают очередь; один тикер в каждый момент матчит только один поток"""
+
+    def __init__(self, threads=1, batch_size=100, poll_interval=0.05):
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _claim(self):
+        with self._lock:
+            queue = PendingMatch.objects.exclude(ticker__in=self._busy)
+            ticker = queue.order_by("id").values_list("ticker", flat=True).first()
+            if ticker is None:
+                return None, []
+            self._busy.add(ticker)
+        return ticker, list(PendingMatch.objects.filter(ticker=ticker).order_by("id")[:self.batch_size])
+
+    def _work(self):
+        try:
+            while not self._stop.is_set():
+                ticker, entries = self._claim()
+                if ticker is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                try:
+                    match_batch(entries)
+                except OperationalError as e:
+                    logger.warning(f"Batch for {ticker} postponed: {e}")
+                    time.sleep(self.poll_interval)
+                finally:
+                    with self._lock:
+                        self._busy.discard(ticker)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                for worker in workers:
+                    worker.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop()
+            for worker in workers:
+                worker.join()
+
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import archive_before
+
+
+class Command(BaseCommand):
+    help = "Переносит исполненные/отменённые ордера и старые сделки в архивные таблицы"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-days", type=float, default=settings.ARCHIVE_RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["retention_days"])
+        moved = archive_before(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(", ".join(f"{name}={count}" for name, count in moved.items()))
@@ -0,0 +1,51 @@
+import json
+import timeit
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from orders.encoders import encode_orderbook, encode_transactions
+from orders.serializers import OrderbookSerializer
+
+
+class Command(BaseCommand):
+    help = "Сравнение DRF-сериализации и быстрого пути encoders.py для стакана и сделок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--levels", type=int, default=25)
+        parser.add_argument("--trades", type=int, default=100)
+        parser.add_argument("--number", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        levels, trades, number = options["levels"], options["trades"], options["number"]
+        renderer = JSONRenderer()
+
+        tick_size = Decimal("0.0100")
+        bids = [(10000 - 25 * i, 10 + i) for i in range(levels)]
+        asks = [(10100 + 25 * i, 10 + i) for i in range(levels)]
+        now = timezone.now()
+        rows = [("ABC", 1 + i, 10050 + 100 * i, now, 1000 + i) for i in range(trades)]
+
+        def orderbook_drf():
+            data = OrderbookSerializer({
+                "bids": [{"price": p * tick_size, "qty": q} for p, q in bids],
+                "asks": [{"price": p * tick_size, "qty": q} for p, q in asks],
+            }).data
+            return renderer.render(data)
+
+        def transactions_drf():
+            data = [{"ticker": t, "amount": a, "price": p * tick_size, "timestamp": ts.isoformat(), "seq": seq} for t, a, p, ts, seq in rows]
+            return renderer.render(data)
+
+        assert json.loads(orderbook_drf()) == json.loads(encode_orderbook(bids, asks, tick_size))
+        assert json.loads(transactions_drf()) == json.loads(encode_transactions(rows, tick_size))
+
+        cases = [
+            (f"orderbook x{levels} levels", orderbook_drf, lambda: encode_orderbook(bids, asks, tick_size)),
+            (f"transactions x{trades}", transactions_drf, lambda: encode_transactions(rows, tick_size)),
+        ]
+        for name, slow, fast in cases:
+            slow_us = timeit.timeit(slow, number=number) / number * 1e6
+            fast_us = timeit.timeit(fast, number=number) / number * 1e6
+            self.stdout.write(f"{name}: drf={slow_us:.1f}us fast={fast_us:.1f}us speedup={slow_us / fast_us:.1f}x")
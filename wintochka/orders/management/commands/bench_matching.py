@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from balances.models import Balance
+from instruments.models import Instrument
+from orders.intake import MatchingWorkerPool, queue_depth
+from orders.models import LimitOrder, MarketOrder, OrderStatus, PendingMatch
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест async-матчинга: скорость разбора очереди пулом run_matching"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", default="1,2,4", help="Список числа потоков пула через запятую")
+        parser.add_argument("--tickers", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=250, help="Рыночных ордеров на тикер")
+        parser.add_argument("--timeout", type=float, default=300)
+
+    def handle(self, *args, **options):
+        baseline = None
+        for threads in [int(n) for n in options["threads"].split(",")]:
+            with tempfile.TemporaryDirectory() as tmp:
+                self._use_database(os.path.join(tmp, "bench.sqlite3"))
+                self._seed(options["tickers"], options["orders"])
+                total = queue_depth()
+
+                pool = MatchingWorkerPool(threads=threads, poll_interval=0.01)
+                runner = threading.Thread(target=pool.run, daemon=True)
+                started = time.perf_counter()
+                runner.start()
+                try:
+                    while queue_depth() and time.perf_counter() - started < options["timeout"]:
+                        time.sleep(0.05)
+                    elapsed = time.perf_counter() - started
+                    left = queue_depth()
+                finally:
+                    pool.stop()
+                    runner.join()
+                    connections.close_all()
+
+            rate = (total - left) / elapsed
+            baseline = baseline or rate
+            self.stdout.write(
+                f"threads={threads}: {total - left}/{total} orders in {elapsed:.2f}s, "
+                f"{rate:.0f} orders/s, x{rate / baseline:.2f} vs first run"
+            )
+
+    def _use_database(self, path):
+        connections.close_all()
+        connections["default"].settings_dict["NAME"] = path
+        call_command("migrate", verbosity=0)
+
+    def _seed(self, ticker_count, orders_per_ticker):
+        tickers = [f"T{chr(ord('A') + i // 26)}{chr(ord('A') + i % 26)}" for i in range(ticker_count)]
+        for ticker in tickers:
+            Instrument.objects.create(ticker=ticker, name=ticker)
+            seller = User.objects.create(name=f"seller-{ticker}")
+            buyer = User.objects.create(name=f"buyer-{ticker}")
+            Balance.objects.create(user=seller, ticker=ticker, amount=0)
+            Balance.objects.create(user=buyer, ticker="RUB", amount=10 ** 9)
+            LimitOrder.objects.bulk_create(
+                LimitOrder(user=seller, ticker=ticker, direction="SELL", price_ticks=100 + i % 50,
+                           original_qty=1, status=OrderStatus.NEW)
+                for i in range(orders_per_ticker)
+            )
+            markets = MarketOrder.objects.bulk_create(
+                MarketOrder(user=buyer, ticker=ticker, direction="BUY", qty=1, status=OrderStatus.NEW)
+                for _ in range(orders_per_ticker)
+            )
+            PendingMatch.objects.bulk_create(
+                PendingMatch(order_id=order.id, order_type=PendingMatch.MARKET, ticker=ticker) for order in markets
+            )
+        return tickers
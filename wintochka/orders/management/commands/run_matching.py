@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.intake import MatchingWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Пул воркеров, разбирающий очередь ордеров, принятых в async-режиме"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=settings.MATCHING_BATCH_SIZE)
+        parser.add_argument("--poll-interval", type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Matching workers started: threads={options['threads']}")
+        MatchingWorkerPool(
+            threads=options["threads"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        ).run()
@@ -0,0 +1,369 @@
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import Client
+
+from balances.models import Balance
+from instruments.models import Instrument
+from orders.models import LimitOrder, OrderStatus
+from users import throttling
+from users.models import User
+
+# Стресс-тест общих балансов: процессы x потоки шлют вперемешку лимитные и
+# рыночные ордера, отмены и админские зачисления/списания по небольшому
+# набору общих счетов через полный стек (middleware, view, engine). Балансы
+# при этом трогают три схемы блокировок: select_for_update + save()
+# в резерве ордера и execute_trade, F()-обновления в зачислениях и
+# возвратах, чтение с проверкой и UPDATE amount = amount + delta в списаниях.
+#
+# Повторяется с экспоненциальной паузой только 503 — так сервер помечает
+# "database is locked", после которого транзакция откатилась, — как это
+# сделал бы клиент API. 500 не повторяется: запрос мог успеть закоммититься,
+# такие ответы считаются отказами вместе с причиной. Ожиданием лока
+# считается время SQL-выражений дольше --lock-threshold: на SQLite без
+# конкуренции выражение на маленькой базе занимает десятки микросекунд,
+# остальное — ожидание busy timeout.
+#
+# В конце — проверка сохранения: для RUB и каждого актива сумма балансов
+# плюс зарезервированное в открытых лимитных ордерах должна отличаться от
+# начальной ровно на успешные зачисления минус списания.
+
+OPERATIONS = ("limit", "market", "cancel", "deposit", "withdraw")
+DEFAULT_MIX = "limit=4,market=2,cancel=2,deposit=1,withdraw=1"
+PRICE_TICKS = range(95, 106)
+
+# got_request_exception приходит в потоке упавшего запроса. Client сам
+# подписывается на этот сигнал глобально и в нескольких потоках получает
+# чужие исключения — повтор успешно закоммиченного запроса выглядел бы
+# как потеря денег, поэтому причину 500 запоминаем по потокам сами
+_request_errors = threading.local()
+
+
+def _record_request_error(sender, request=None, **kwargs):
+    _request_errors.last = sys.exc_info()[1]
+
+
+def _parse_mix(mix):
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS or not weight.isdigit():
+            raise CommandError(f"Bad --mix entry {item!r}, expected name=weight with name in {', '.join(OPERATIONS)}")
+        weights[name] = int(weight)
+    return weights
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def holdings():
+    """{ticker: сумма балансов + резерв открытых лимитных ордеров}"""
+    totals = defaultdict(int)
+    for ticker, amount in Balance.objects.values_list("ticker").annotate(total=Sum("amount")):
+        totals[ticker] += amount
+    instruments = {i.ticker: i for i in Instrument.objects.all()}
+    for ticker, direction, price_ticks, original_qty, filled in LimitOrder.objects.filter(
+        status__in=OrderStatus.OPEN
+    ).values_list("ticker", "direction", "price_ticks", "original_qty", "filled"):
+        remaining = original_qty - filled
+        if direction == "BUY":
+            totals["RUB"] += instruments[ticker].notional(remaining, price_ticks)
+        else:
+            totals[ticker] += remaining
+    return dict(totals)
+
+
+class StatementTimer:
+    """execute_wrapper потока: сколько SQL-выражений ждали лок и сколько времени"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.statements = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.statements += 1
+            if elapsed >= self.threshold:
+                self.waits += 1
+                self.wait_time += elapsed
+
+
+class StressWorker:
+    def __init__(self, index, accounts, admin_key, tickers, weights, options):
+        self.random = random.Random(options["seed"] * 1000 + index)
+        self.accounts = accounts
+        self.admin_key = admin_key
+        self.tickers = tickers
+        self.operations = list(weights)
+        self.weights = list(weights.values())
+        self.deadline = time.perf_counter() + options["duration"]
+        self.retries = options["retries"]
+        self.timer = StatementTimer(options["lock_threshold"] / 1000)
+        self.client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0], raise_request_exception=False)
+        self.open_orders = []
+        self.counts = defaultdict(Counter)
+        self.latencies = defaultdict(list)
+        self.admin_delta = Counter()
+        self.errors = Counter()
+
+    def _call(self, method, path, api_key, data=None):
+        headers = {"HTTP_AUTHORIZATION": f"TOKEN {api_key}"}
+        if data is None:
+            return getattr(self.client, method)(path, **headers)
+        return getattr(self.client, method)(path, data, content_type="application/json", **headers)
+
+    def _request(self):
+        """(имя операции, метод, путь, ключ, тело, коды успеха, коды отказа) или None"""
+        user_id, api_key = self.random.choice(self.accounts)
+        ticker = self.random.choice(self.tickers)
+        operation = self.random.choices(self.operations, self.weights)[0]
+        direction = self.random.choice(("BUY", "SELL"))
+        qty = self.random.randint(1, 5)
+        if operation == "limit":
+            data = {"ticker": ticker, "direction": direction, "original_qty": qty, "price": self.random.choice(PRICE_TICKS)}
+            return operation, "post", "/api/v1/order", api_key, data, (201,), (400,)
+        if operation == "market":
+            data = {"ticker": ticker, "direction": direction, "qty": qty}
+            return operation, "post", "/api/v1/order", api_key, data, (201,), (400,)
+        if operation == "cancel":
+            if not self.open_orders:
+                return None
+            order_id, api_key = self.open_orders.pop(self.random.randrange(len(self.open_orders)))
+            # 400 — ордер успели исполнить
+            return operation, "delete", f"/api/v1/order/{order_id}", api_key, None, (200,), (400,)
+        ticker = self.random.choice(("RUB", ticker))
+        amount = self.random.randint(1, 1000) if ticker == "RUB" else qty
+        data = {"user_id": user_id, "ticker": ticker, "amount": amount}
+        return operation, "post", f"/api/v1/admin/balance/{operation}", self.admin_key, data, (200,), (422,)
+
+    def _execute(self, request):
+        operation, method, path, api_key, data, ok, rejected = request
+        counts = self.counts[operation]
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                counts["retries"] += 1
+                time.sleep(self.random.uniform(0, 0.005 * 2 ** attempt))
+            _request_errors.last = None
+            response = self._call(method, path, api_key, data)
+            if response.status_code == 503:
+                counts["locked"] += 1
+                continue
+            if response.status_code >= 500:
+                error = _request_errors.last
+                counts["db_errors" if isinstance(error, OperationalError) else "server_errors"] += 1
+                self.errors[f"{type(error).__name__}: {error}"] += 1
+                counts["failed"] += 1
+                return
+            break
+        else:
+            counts["failed"] += 1
+            return
+        self.latencies[operation].append(time.perf_counter() - started)
+
+        if response.status_code in ok:
+            counts["ok"] += 1
+            if operation == "limit" and response.json()["status"] in OrderStatus.OPEN:
+                self.open_orders.append((response.json()["order_id"], api_key))
+            elif operation in ("deposit", "withdraw"):
+                sign = 1 if operation == "deposit" else -1
+                self.admin_delta[data["ticker"]] += sign * data["amount"]
+        elif response.status_code in rejected:
+            counts["rejected"] += 1
+        else:
+            counts[f"http_{response.status_code}"] += 1
+
+    def run(self):
+        try:
+            with connection.execute_wrapper(self.timer):
+                while time.perf_counter() < self.deadline:
+                    request = self._request()
+                    if request is not None:
+                        self._execute(request)
+        finally:
+            connection.close()
+
+    def result(self):
+        return {
+            "counts": {operation: dict(counts) for operation, counts in self.counts.items()},
+            "latencies": dict(self.latencies),
+            "admin_delta": dict(self.admin_delta),
+            "errors": dict(self.errors),
+            "statements": self.timer.statements,
+            "waits": self.timer.waits,
+            "wait_time": self.timer.wait_time,
+        }
+
+
+def run_process(process_index, accounts, admin_key, tickers, weights, options, results):
+    workers = [
+        StressWorker(process_index * options["threads"] + i, accounts, admin_key, tickers, weights, options)
+        for i in range(options["threads"])
+    ]
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put([worker.result() for worker in workers])
+
+
+class Command(BaseCommand):
+    help = "Стресс-тест блокировок балансов: ордера, отмены, зачисления по общим счетам и проверка сохранения средств"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=4, help="Потоков в каждом процессе")
+        parser.add_argument("--duration", type=float, default=10, help="Секунд нагрузки")
+        parser.add_argument("--accounts", type=int, default=4, help="Общих счетов, по которым бьют все потоки")
+        parser.add_argument("--tickers", type=int, default=2)
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Веса операций")
+        parser.add_argument("--retries", type=int, default=5, help="Повторов запроса после 503 ('database is locked')")
+        parser.add_argument("--lock-threshold", type=float, default=2.0, help="мс; более долгое выражение считается ожиданием лока")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        weights = _parse_mix(options["mix"])
+        with tempfile.TemporaryDirectory() as tmp:
+            self._use_database(tmp)
+            accounts, admin_key, tickers = self._seed(options["accounts"], options["tickers"])
+            before = holdings()
+
+            # Логи view на каждый ордер сериализовали бы воркеры на файле debug.log
+            logging.disable(logging.CRITICAL)
+            got_request_exception.connect(_record_request_error)
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            results = context.Queue()
+            processes = [
+                context.Process(target=run_process, args=(i, accounts, admin_key, tickers, weights, options, results))
+                for i in range(options["processes"])
+            ]
+            started = time.perf_counter()
+            for process in processes:
+                process.start()
+            workers = [result for _ in processes for result in results.get()]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - started
+            logging.disable(logging.NOTSET)
+            got_request_exception.disconnect(_record_request_error)
+
+            self._report(workers, elapsed)
+            self._check_conservation(before, holdings(), workers)
+            connections.close_all()
+
+    def _use_database(self, tmp):
+        connections.close_all()
+        connections["default"].settings_dict["NAME"] = os.path.join(tmp, "stress.sqlite3")
+        # Хранилище лимитов — тоже временное
+        throttling.store.path = os.path.join(tmp, "ratelimit.sqlite3")
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {scope: "1000000/second" for scope in settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]},
+        }
+        settings.MATCHING_QUEUE_MAX_DEPTH = 10 ** 9
+        call_command("migrate", verbosity=0)
+
+    def _seed(self, account_count, ticker_count):
+        tickers = [f"S{chr(ord('A') + i // 26)}{chr(ord('A') + i % 26)}" for i in range(ticker_count)]
+        for ticker in tickers:
+            Instrument.objects.create(ticker=ticker, name=ticker)
+        accounts = []
+        for i in range(account_count):
+            user = User.objects.create(name=f"stress-{i}")
+            Balance.objects.bulk_create(
+                [Balance(user=user, ticker="RUB", amount=10 ** 6)]
+                + [Balance(user=user, ticker=ticker, amount=10 ** 4) for ticker in tickers]
+            )
+            accounts.append((str(user.id), str(user.api_key)))
+        admin = User.objects.create(name="stress-admin", role="ADMIN")
+        return accounts, str(admin.api_key), tickers
+
+    def _report(self, workers, elapsed):
+        counts = defaultdict(Counter)
+        latencies = defaultdict(list)
+        for worker in workers:
+            for operation, operation_counts in worker["counts"].items():
+                counts[operation].update(operation_counts)
+            for operation, values in worker["latencies"].items():
+                latencies[operation].extend(values)
+
+        total = Counter()
+        for operation in OPERATIONS:
+            if operation not in counts:
+                continue
+            c = counts[operation]
+            total.update(c)
+            done = c["ok"] + c["rejected"]
+            attempts = done + c["failed"] + c["retries"]
+            self.stdout.write(
+                f"{operation:>8}: {c['ok']} ok, {c['rejected']} rejected, {c['failed']} failed, "
+                f"{done / elapsed:.0f}/s, retries {c['retries'] / max(done + c['failed'], 1):.2%}, "
+                f"locked {c['locked'] / max(attempts, 1):.2%}, "
+                f"p50 {statistics.median(latencies[operation]) * 1000 if latencies[operation] else 0:.1f}ms "
+                f"p99 {_percentile(latencies[operation], 0.99) * 1000:.1f}ms"
+                + "".join(f", {key} {value}" for key, value in sorted(c.items()) if key.startswith(("http_", "db_", "server_")))
+            )
+
+        done = total["ok"] + total["rejected"]
+        statements = sum(w["statements"] for w in workers)
+        waits = sum(w["waits"] for w in workers)
+        wait_time = sum(w["wait_time"] for w in workers)
+        self.stdout.write(
+            f"   total: {done} requests in {elapsed:.2f}s, {done / elapsed:.0f}/s, "
+            f"{total['retries']} retries, {total['locked']} 'database is locked', {total['failed']} failed"
+        )
+        self.stdout.write(
+            f"   locks: {waits} of {statements} statements waited, {wait_time:.2f}s total "
+            f"({wait_time / (elapsed * len(workers)):.1%} of worker time)"
+        )
+        errors = Counter()
+        for worker in workers:
+            errors.update(worker["errors"])
+        for error, count in errors.most_common():
+            self.stdout.write(f"   500 x{count}: {error}")
+
+    def _check_conservation(self, before, after, workers):
+        admin_delta = Counter()
+        for worker in workers:
+            admin_delta.update(worker["admin_delta"])
+
+        mismatched = []
+        for ticker in sorted(set(before) | set(after)):
+            expected = before.get(ticker, 0) + admin_delta[ticker]
+            actual = after.get(ticker, 0)
+            self.stdout.write(f"{ticker:>8}: start {before.get(ticker, 0)}, admin {admin_delta[ticker]:+d}, end {actual}")
+            if actual != expected:
+                mismatched.append(f"{ticker} off by {actual - expected:+d}")
+
+        negative = Balance.objects.filter(amount__lt=0).count()
+        if negative:
+            mismatched.append(f"{negative} negative balances")
+        if mismatched:
+            raise CommandError(f"Conservation check failed: {'; '.join(mismatched)}")
+        self.stdout.write("Conservation check passed")
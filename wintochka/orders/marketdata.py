@@ -0,0 +1,282 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, ExpressionWrapper, IntegerField
+
+from instruments.models import Instrument
+from .encoders import encode_orderbook_levels, encode_transaction_items
+from .models import LimitOrder, OrderStatus, Transaction, ArchivedTransaction
+
+logger = logging.getLogger(__name__)
+
+# Публичные стакан и лента сделок, общие для всех процессов хоста. На каждый
+# тикер — файл фиксированного размера в MARKET_DATA_DIR (лучше tmpfs, например
+# /dev/shm), отображённый в память каждого воркера. Тот, кто изменил стакан
+# (match_order, cancel_order, делистинг), после коммита перечитывает снимок из
+# БД и пишет его в область: уже закодированные JSON-элементы уровней и сделок
+# плюс таблица смещений, так что ответ любой глубины — срез байтов без
+# кодирования. Читатели ходят только в память.
+#
+# Согласованность — seqlock: писатель делает seq нечётным, пишет данные и
+# делает seq чётным; читатель повторяет чтение, если seq был нечётным или
+# изменился. Писатели одного тикера сериализованы flock на файле, и снимок
+# из БД берётся уже под локом — поэтому более старый снимок не может
+# перезаписать более новый. CRC данных в заголовке дополнительно защищает от
+# рваного чтения там, где запись в mmap может переупорядочиться.
+#
+# Файлы в tmpfs переживают рестарт воркеров, поэтому процесс не доверяет
+# найденной области, пока сам не перечитает в неё снимок из БД. Если
+# публикация после коммита не удалась, область снимается (RETIRED), и читатели
+# отвечают из БД до следующей удачной публикации.
+
+ORDERBOOK_DEPTH = 25
+TRANSACTIONS_DEPTH = 100
+
+EMPTY, LIVE, RETIRED = 0, 1, 2
+
+# seq, state, длина данных, crc32 данных
+HEADER = struct.Struct("<QIII")
+# Лучшие bid и ask в тиках (NO_PRICE — уровня нет) для /ticker
+BEST = struct.Struct("<qq")
+NO_PRICE = -1
+# Число уровней bids, asks и сделок; за ними — концы элементов в каждой группе
+COUNTS = struct.Struct("<HHH")
+READ_ATTEMPTS = 100
+
+
+def enabled():
+    return settings.MARKET_DATA_DIR is not None
+
+
+def _path(ticker):
+    return os.path.join(settings.MARKET_DATA_DIR, f"{ticker}.mmap")
+
+
+def load_orderbook(ticker, limit):
+    """(bids, asks, tick_size) из БД; tick_size None для неизвестного тикера"""
+    tick_size = Instrument.objects.filter(ticker=ticker).values_list("tick_size", flat=True).first()
+    if tick_size is None:
+        return (), (), None
+    orders = LimitOrder.objects.filter(ticker=ticker, status__in=OrderStatus.OPEN).annotate(
+        remaining_qty=ExpressionWrapper(F("original_qty") - F("filled"), output_field=IntegerField())
+    ).filter(remaining_qty__gt=0)
+
+    bids = orders.filter(direction="BUY").values_list("price_ticks").annotate(qty=Sum("remaining_qty")).order_by("-price_ticks")[:limit]
+    asks = orders.filter(direction="SELL").values_list("price_ticks").annotate(qty=Sum("remaining_qty")).order_by("price_ticks")[:limit]
+    return list(bids), list(asks), tick_size
+
+
+TRANSACTION_FIELDS = ("ticker", "amount", "price_ticks", "timestamp", "seq")
+
+
+def load_transactions(ticker, limit):
+    """Последние limit сделок, новые первыми (по seq — порядку коммита), с дочитыванием архива"""
+    transactions = list(Transaction.objects.filter(ticker=ticker).order_by("-seq").values_list(*TRANSACTION_FIELDS)[:limit])
+    if len(transactions) < limit:
+        # Всё в архиве старше любой горячей сделки, так что просто дочитываем хвост
+        transactions += ArchivedTransaction.objects.filter(ticker=ticker).order_by("-seq").values_list(*TRANSACTION_FIELDS)[:limit - len(transactions)]
+    return transactions
+
+
+def _pack(groups):
+    """groups — списки закодированных элементов; элементы группы склеиваются через запятую"""
+    ends, blobs = [], []
+    for items in groups:
+        blob = b",".join(items)
+        end = 0
+        for item in items:
+            end += len(item) + (1 if end else 0)
+            ends.append(end)
+        blobs.append(blob)
+    return (
+        COUNTS.pack(*(len(items) for items in groups))
+        + struct.pack(f"<{len(ends)}I", *ends)
+        + b"".join(blobs)
+    )
+
+
+class Snapshot:
+    def __init__(self, payload):
+        self.best_bid, self.best_ask = (None if ticks == NO_PRICE else ticks for ticks in BEST.unpack_from(payload))
+        counts = COUNTS.unpack_from(payload, BEST.size)
+        ends = struct.unpack_from(f"<{sum(counts)}I", payload, BEST.size + COUNTS.size)
+        self._groups = []
+        start, index = BEST.size + COUNTS.size + 4 * len(ends), 0
+        for count in counts:
+            group_ends = ends[index:index + count]
+            size = group_ends[-1] if count else 0
+            self._groups.append((payload[start:start + size], group_ends))
+            start, index = start + size, index + count
+
+    def _prefix(self, group, limit):
+        blob, ends = self._groups[group]
+        return blob[:ends[min(limit, len(ends)) - 1]] if limit and ends else b""
+
+    def orderbook(self, limit):
+        return b'{"bids":[%s],"asks":[%s]}' % (self._prefix(0, limit), self._prefix(1, limit))
+
+    def transactions(self, limit):
+        return b"[%s]" % self._prefix(2, limit)
+
+
+class MarketDataRegions:
+    """Отображения файлов тикеров в памяти процесса: на чтение и на запись"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._readers = {}
+        self._writers = {}
+        # Пути, в которые этот процесс уже публиковал: им можно верить
+        self._seeded = set()
+
+    def _reader(self, ticker):
+        path = _path(ticker)
+        region = self._readers.get(path)
+        if region is not None:
+            return region
+        if not os.path.exists(path):
+            return None
+        if path not in self._seeded:
+            # Файл мог пережить рестарт (tmpfs живёт дольше процессов), а БД за
+            # это время поменяться в обход публикаций: перечитываем снимок
+            try:
+                self.publish(ticker)
+            except Exception as e:
+                logger.error(f"Market data reseed for {ticker} failed: {e}")
+                return None
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < settings.MARKET_DATA_REGION_BYTES:
+                    # Писатель ещё не дорастил файл
+                    return None
+                region = mmap.mmap(f.fileno(), settings.MARKET_DATA_REGION_BYTES, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        with self._lock:
+            return self._readers.setdefault(path, region)
+
+    def _writer(self, ticker):
+        path = _path(ticker)
+        with self._lock:
+            writer = self._writers.get(path)
+            if writer is None:
+                os.makedirs(settings.MARKET_DATA_DIR, exist_ok=True)
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                if os.fstat(fd).st_size < settings.MARKET_DATA_REGION_BYTES:
+                    os.ftruncate(fd, settings.MARKET_DATA_REGION_BYTES)
+                # flock исключает другие процессы, потоки своего — обычный лок
+                writer = self._writers[path] = (fd, mmap.mmap(fd, settings.MARKET_DATA_REGION_BYTES), threading.Lock())
+            return writer
+
+    def read(self, ticker):
+        """Snapshot тикера или None — тогда отвечаем из БД"""
+        if not ticker.isalnum():
+            return None
+        region = self._reader(ticker)
+        if region is None:
+            return None
+        for _ in range(READ_ATTEMPTS):
+            seq, state, length, crc = HEADER.unpack_from(region)
+            if seq & 1:
+                continue
+            payload = region[HEADER.size:HEADER.size + length]
+            if HEADER.unpack_from(region)[0] != seq:
+                continue
+            if state != LIVE:
+                return None
+            if zlib.crc32(payload) != crc:
+                continue
+            return Snapshot(payload)
+        logger.warning(f"Market data for {ticker} kept changing under the reader, falling back to the database")
+        return None
+
+    def _write(self, region, state, payload=b""):
+        seq = HEADER.unpack_from(region)[0]
+        HEADER.pack_into(region, 0, seq + 1, EMPTY, 0, 0)
+        region[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(region, 0, seq + 2, state, len(payload), zlib.crc32(payload))
+
+    @contextmanager
+    def _locked(self, ticker):
+        fd, region, lock = self._writer(ticker)
+        with lock:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield region
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def publish(self, ticker):
+        """Перечитывает стакан и ленту тикера из БД и пишет в область"""
+        if not ticker.isalnum():
+            return
+        with self._locked(ticker) as region:
+            self._publish(ticker, region)
+        self._seeded.add(_path(ticker))
+
+    def retire(self, ticker):
+        """Снимает снимок тикера: до следующей публикации читатели идут в БД"""
+        if not ticker.isalnum():
+            return
+        with self._locked(ticker) as region:
+            self._write(region, RETIRED)
+
+    def _publish(self, ticker, region):
+        bids, asks, tick_size = load_orderbook(ticker, ORDERBOOK_DEPTH)
+        if tick_size is None:
+            # Инструмент удалён: читатели уходят в БД и получают пустой ответ
+            self._write(region, RETIRED)
+            return
+        payload = BEST.pack(bids[0][0] if bids else NO_PRICE, asks[0][0] if asks else NO_PRICE) + _pack([
+            encode_orderbook_levels(bids, tick_size),
+            encode_orderbook_levels(asks, tick_size),
+            encode_transaction_items(load_transactions(ticker, TRANSACTIONS_DEPTH), tick_size),
+        ])
+        if HEADER.size + len(payload) > settings.MARKET_DATA_REGION_BYTES:
+            logger.warning(f"Market data for {ticker} does not fit into {settings.MARKET_DATA_REGION_BYTES} bytes")
+            self._write(region, RETIRED)
+            return
+        self._write(region, LIVE, payload)
+
+
+regions = MarketDataRegions()
+
+_pending = threading.local()
+
+
+def _flush():
+    tickers = getattr(_pending, "tickers", set())
+    _pending.tickers = set()
+    for ticker in tickers:
+        try:
+            regions.publish(ticker)
+        except Exception as e:
+            # Изменение уже закоммичено, а в области — снимок до него: снимаем
+            # его, чтобы читатели не отдавали устаревший стакан
+            logger.error(f"Market data publish for {ticker} failed: {e}")
+            try:
+                regions.retire(ticker)
+            except Exception as e:
+                logger.critical(f"Market data for {ticker} is stale and could not be retired: {e}")
+
+
+def changed(ticker):
+    """Стакан или лента тикера изменились; снимок публикуется после коммита.
+
+    Несколько изменений в одной транзакции (пачка run_matching) дают одну
+    публикацию: первый сработавший колбэк публикует все накопленные тикеры.
+    """
+    if not enabled():
+        return
+    if not hasattr(_pending, "tickers"):
+        _pending.tickers = set()
+    _pending.tickers.add(ticker)
+    transaction.on_commit(_flush)
@@ -0,0 +1,137 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Цена, не кратная tick_size, не округляется: округлённый BUY вернул бы при
+# отмене или исполнении не ту сумму, что зарезервировал. Если у тикера есть
+# такие цены, tick_size уменьшается до самого мелкого десятичного шага среди
+# них — при условии, что lot_size * tick_size остаётся целым. Иначе миграция
+# останавливается со списком строк, которые нужно поправить вручную.
+#
+# Так же она останавливается, если количество в ордерах или сделках не кратно
+# lot_size инструмента: стоимость считается по лотам, и резерв такого ордера
+# нельзя было бы вернуть точно.
+
+OFF_GRID_LISTING = 20
+
+
+def _decimal_places(price):
+    return max(0, -price.normalize().as_tuple().exponent)
+
+
+def _off_grid_rows(models_, ticker, tick_size):
+    rows = []
+    for model in models_:
+        for pk, price in model.objects.filter(ticker=ticker).values_list("pk", "price"):
+            if price % tick_size:
+                rows.append(f"{model.__name__} {pk}: {price}")
+    return rows
+
+
+# (модель, поля количества)
+QUANTITY_FIELDS = [
+    ("LimitOrder", ("original_qty", "filled")),
+    ("MarketOrder", ("qty", "filled")),
+    ("Transaction", ("amount",)),
+]
+
+
+def _listing(rows):
+    return "; ".join(rows[:OFF_GRID_LISTING]) + (f"; ... {len(rows)} rows" if len(rows) > OFF_GRID_LISTING else "")
+
+
+def _off_lot_problems(apps, instruments):
+    problems = []
+    for ticker, instrument in sorted(instruments.items()):
+        if instrument.lot_size == 1:
+            continue
+        rows = []
+        for model_name, fields in QUANTITY_FIELDS:
+            for pk, *quantities in apps.get_model("orders", model_name).objects.filter(ticker=ticker).values_list("pk", *fields):
+                if any(qty % instrument.lot_size for qty in quantities):
+                    rows.append(f"{model_name} {pk}: " + ", ".join(f"{field}={qty}" for field, qty in zip(fields, quantities)))
+        if rows:
+            problems.append(f"{ticker} (lot_size {instrument.lot_size}): {_listing(rows)}")
+    return problems
+
+
+def prices_to_ticks(apps, schema_editor):
+    Instrument = apps.get_model("instruments", "Instrument")
+    models_ = [apps.get_model("orders", name) for name in ("LimitOrder", "Transaction")]
+    instruments = {instrument.ticker: instrument for instrument in Instrument.objects.all()}
+
+    prices = defaultdict(set)
+    for model in models_:
+        for ticker, price in model.objects.values_list("ticker", "price").distinct():
+            prices[ticker].add(price)
+
+    tick_sizes, problems = {}, []
+    for ticker, ticker_prices in sorted(prices.items()):
+        instrument = instruments.get(ticker)
+        tick_size = instrument.tick_size if instrument else Decimal(1)
+        if all(price % tick_size == 0 for price in ticker_prices):
+            tick_sizes[ticker] = tick_size
+            continue
+        finer = Decimal(1).scaleb(-max(_decimal_places(price) for price in ticker_prices))
+        lot_value = instrument.lot_size * finer if instrument else None
+        if lot_value is None or lot_value != lot_value.to_integral_value():
+            rows = _off_grid_rows(models_, ticker, tick_size)
+            problems.append(
+                f"{ticker} (tick_size {tick_size}, {'no instrument' if instrument is None else f'lot_size {instrument.lot_size}'}): "
+                + _listing(rows)
+            )
+            continue
+        instrument.tick_size = finer
+        instrument.save(update_fields=["tick_size"])
+        tick_sizes[ticker] = finer
+
+    if problems:
+        raise RuntimeError(
+            "Prices off the tick grid, fix the instrument tick_size/lot_size or the rows and migrate again:\n"
+            + "\n".join(problems)
+        )
+    problems = _off_lot_problems(apps, instruments)
+    if problems:
+        raise RuntimeError(
+            "Quantities not divisible by lot_size, fix the instrument lot_size or the rows and migrate again:\n"
+            + "\n".join(problems)
+        )
+
+    for model in models_:
+        rows = list(model.objects.only("pk", "ticker", "price"))
+        for row in rows:
+            row.price_ticks = int(row.price / tick_sizes[row.ticker])
+        model.objects.bulk_update(rows, ["price_ticks"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instruments', '0002_tick_and_lot_size'),
+        ('orders', '0002_pending_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='limitorder',
+            name='price_ticks',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='price_ticks',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(prices_to_ticks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='limitorder',
+            name='price',
+        ),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='price',
+        ),
+    ]
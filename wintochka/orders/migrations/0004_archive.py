@@ -0,0 +1,41 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_price_ticks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('order_type', models.CharField(choices=[('LIMIT', 'LIMIT'), ('MARKET', 'MARKET')], max_length=6)),
+                ('user_id', models.UUIDField(db_index=True)),
+                ('ticker', models.CharField(max_length=16)),
+                ('direction', models.CharField(max_length=4)),
+                ('price_ticks', models.BigIntegerField(null=True)),
+                ('qty', models.PositiveIntegerField()),
+                ('filled', models.PositiveIntegerField()),
+                ('status', models.CharField(max_length=32)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ticker', models.CharField(max_length=16)),
+                ('amount', models.PositiveIntegerField()),
+                ('price_ticks', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticker', '-timestamp'], name='orders_arch_ticker_e457a5_idx')],
+            },
+        ),
+    ]
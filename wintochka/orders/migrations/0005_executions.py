@@ -0,0 +1,71 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='maker_order_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='maker_user_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='taker_order_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='taker_user_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='maker_order_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='maker_user_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='taker_order_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='taker_user_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.CreateModel(
+            name='Execution',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField()),
+                ('trade_id', models.BigIntegerField()),
+                ('order_id', models.UUIDField()),
+                ('ticker', models.CharField(max_length=16)),
+                ('direction', models.CharField(max_length=4)),
+                ('liquidity', models.CharField(choices=[('MAKER', 'MAKER'), ('TAKER', 'TAKER')], max_length=5)),
+                ('qty', models.PositiveIntegerField()),
+                ('price_ticks', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'id'], name='orders_exec_user_id_7f2b20_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.21 on 2026-10-19 00:35
+
+import heapq
+
+from django.db import migrations, models
+import orders.ids
+
+# (модель, поле времени) всех таблиц, где живут ордера и сделки
+SEQUENCED = [
+    ("LimitOrder", "created_at"),
+    ("MarketOrder", "created_at"),
+    ("Transaction", "timestamp"),
+    ("ArchivedOrder", "created_at"),
+    ("ArchivedTransaction", "timestamp"),
+]
+
+
+def number_existing_events(apps, schema_editor):
+    """Нумерует существующие ордера и сделки по времени, общей последовательностью"""
+    streams = [_stream(apps, index) for index in range(len(SEQUENCED))]
+
+    seq = 0
+    pending = {index: [] for index in range(len(SEQUENCED))}
+    for _, index, pk in heapq.merge(*streams):
+        seq += 1
+        pending[index].append((pk, seq))
+        if len(pending[index]) >= 1000:
+            _flush(apps, index, pending[index])
+    for index, rows in pending.items():
+        _flush(apps, index, rows)
+
+    apps.get_model("orders", "EventSequence").objects.create(name="events", value=seq)
+
+
+def _stream(apps, index):
+    model_name, time_field = SEQUENCED[index]
+    rows = apps.get_model("orders", model_name).objects.order_by(time_field, "pk").values_list(time_field, "pk")
+    for moment, pk in rows.iterator():
+        yield moment, index, pk
+
+
+def _flush(apps, index, rows):
+    model = apps.get_model("orders", SEQUENCED[index][0])
+    model.objects.bulk_update([model(pk=pk, seq=seq) for pk, seq in rows], ["seq"])
+    rows.clear()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_executions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSequence',
+            fields=[
+                ('name', models.CharField(max_length=16, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='limitorder',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='marketorder',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='limitorder',
+            name='id',
+            field=models.UUIDField(default=orders.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='marketorder',
+            name='id',
+            field=models.UUIDField(default=orders.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(number_existing_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:08
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copy_trade_seq(apps, schema_editor):
+    """seq исполнения — seq его сделки, горячей или уже в архиве"""
+    Execution = apps.get_model("orders", "Execution")
+    Transaction = apps.get_model("orders", "Transaction")
+    ArchivedTransaction = apps.get_model("orders", "ArchivedTransaction")
+    Execution.objects.update(seq=Coalesce(
+        Subquery(Transaction.objects.filter(id=OuterRef("trade_id")).values("seq")[:1]),
+        Subquery(ArchivedTransaction.objects.filter(id=OuterRef("trade_id")).values("seq")[:1]),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_event_sequence'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='execution',
+            name='orders_exec_user_id_7f2b20_idx',
+        ),
+        migrations.AddField(
+            model_name='execution',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(copy_trade_seq, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='execution',
+            index=models.Index(fields=['user_id', 'seq'], name='orders_exec_user_id_90cbf0_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_execution_seq'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['timestamp'], name='orders_tran_timesta_ca50d2_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:30
+
+import heapq
+
+from django.db import migrations, models
+
+# (модель, поле времени) таблиц с обязательным seq
+SEQUENCED = [
+    ("LimitOrder", "created_at"),
+    ("MarketOrder", "created_at"),
+    ("Transaction", "timestamp"),
+]
+
+
+def number_unnumbered_events(apps, schema_editor):
+    """Нумерует строки, созданные bulk_create без seq, по времени — после всех уже пронумерованных"""
+    EventSequence = apps.get_model("orders", "EventSequence")
+    sequence, _ = EventSequence.objects.get_or_create(name="events")
+    streams = [_stream(apps, index) for index in range(len(SEQUENCED))]
+
+    seq = sequence.value
+    pending = {index: [] for index in range(len(SEQUENCED))}
+    for _, index, pk in heapq.merge(*streams):
+        seq += 1
+        pending[index].append((pk, seq))
+        if len(pending[index]) >= 1000:
+            _flush(apps, index, pending[index])
+    for index, rows in pending.items():
+        _flush(apps, index, rows)
+
+    EventSequence.objects.filter(name="events").update(value=seq)
+
+
+def _stream(apps, index):
+    model_name, time_field = SEQUENCED[index]
+    rows = apps.get_model("orders", model_name).objects.filter(seq__isnull=True).order_by(time_field, "pk").values_list(time_field, "pk")
+    for moment, pk in rows.iterator():
+        yield moment, index, pk
+
+
+def _flush(apps, index, rows):
+    model = apps.get_model("orders", SEQUENCED[index][0])
+    model.objects.bulk_update([model(pk=pk, seq=seq) for pk, seq in rows], ["seq"])
+    rows.clear()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_transaction_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(number_unnumbered_events, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='limitorder',
+            name='seq',
+            field=models.BigIntegerField(editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='marketorder',
+            name='seq',
+            field=models.BigIntegerField(editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='seq',
+            field=models.BigIntegerField(editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_seq_not_null'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='limitorder',
+            index=models.Index(fields=['status', 'ticker', 'direction', 'price_ticks'], name='orders_limi_status_c45582_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.21 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_limitorder_best_price_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedtransaction',
+            name='orders_arch_ticker_e457a5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['ticker', 'seq'], name='orders_arch_ticker_9b00d3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['ticker', 'seq'], name='orders_tran_ticker_ea8f78_idx'),
+        ),
+    ]
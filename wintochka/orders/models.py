@@ -1,10 +1,8 @@
 import logging
-from uuid import UUID
-from django.db import models
+from django.db import connection, models
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
-
-User = get_user_model()
+from users.models import User
+from .ids import uuid7
 
 class OrderStatus:
     NEW = "NEW"
@@ -19,8 +17,84 @@ class OrderStatus:
         (CANCELLED, "CANCELLED")
     ]
 
-class MarketOrder(models.Model):
-    id = models.UUIDField(primary_key=True, editable=False)
+    # Лимитный ордер в OPEN-статусе лежит в стакане; TERMINAL уже не изменится
+    OPEN = (NEW, PARTIALLY_EXECUTED)
+    TERMINAL = (EXECUTED, CANCELLED)
+
+class EventSequence(models.Model):
+    """Общая для ордеров и сделок монотонная последовательность (одна строка)"""
+    EVENTS = "events"
+
+    name = models.CharField(max_length=16, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, count=1):
+        """Резервирует count номеров подряд одним UPDATE; возвращает первый.
+
+        UPDATE идёт в транзакции вызывающего: номера монотонны между всеми
+        процессами и откатываются вместе с ордером или сделкой.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {cls._meta.db_table} SET value = value + %s WHERE name = %s RETURNING value",
+                [count, cls.EVENTS],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            # Строку создаёт миграция 0006; сюда попадаем только без неё
+            cls.objects.get_or_create(name=cls.EVENTS)
+            return cls.reserve(count)
+        return row[0] - count + 1
+
+    @classmethod
+    def next(cls):
+        return cls.reserve(1)
+
+    @classmethod
+    def block(cls, limit=64):
+        """Номера по требованию: резервирует пачками 1, 2, 4... до limit.
+
+        Для циклов вроде матчинга, где число событий заранее неизвестно;
+        неиспользованный хвост пачки остаётся дырой в последовательности.
+        Брать номер нужно вне savepoint'а, который может откатиться.
+        """
+        size = 1
+        while True:
+            first = cls.reserve(size)
+            yield from range(first, first + size)
+            size = min(size * 2, limit)
+
+
+class SequencedQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не зовёт save(): номера всей пачке — одним резервированием
+        objs = list(objs)
+        missing = [obj for obj in objs if obj.seq is None]
+        if missing:
+            first = EventSequence.reserve(len(missing))
+            for offset, obj in enumerate(missing):
+                obj.seq = first + offset
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class Sequenced(models.Model):
+    """seq — номер события: порядок для price-time приоритета, курсор и маркер изменений"""
+    seq = models.BigIntegerField(unique=True, editable=False)
+
+    objects = SequencedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.seq is None:
+            self.seq = EventSequence.next()
+        super().save(*args, **kwargs)
+
+
+class MarketOrder(Sequenced):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     ticker = models.CharField(max_length=16)
     direction = models.CharField(max_length=4, choices=[("BUY", "BUY"), ("SELL", "SELL")])
@@ -29,19 +103,106 @@ class MarketOrder(models.Model):
     filled = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
-class LimitOrder(models.Model):
-    id = models.UUIDField(primary_key=True, editable=False)
+    @property
+    def original_qty(self):
+        return self.qty
+
+class LimitOrder(Sequenced):
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     ticker = models.CharField(max_length=16)
     direction = models.CharField(max_length=4, choices=[("BUY", "BUY"), ("SELL", "SELL")])
-    price = models.DecimalField(max_digits=20, decimal_places=4)
+    price_ticks = models.BigIntegerField()
     original_qty = models.PositiveIntegerField()
     filled = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=32, choices=OrderStatus.CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
 
-class Transaction(models.Model):
+    class Meta:
+        # Лучшие цены в /ticker: открытые ордера читаются из индекса, без таблицы
+        indexes = [models.Index(fields=["status", "ticker", "direction", "price_ticks"])]
+
+class Transaction(Sequenced):
     ticker = models.CharField(max_length=16)
     amount = models.PositiveIntegerField()
-    price = models.DecimalField(max_digits=20, decimal_places=4)
+    price_ticks = models.BigIntegerField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Maker — ордер из стакана, taker — входящий. Пусто у сделок до появления полей
+    maker_order_id = models.UUIDField(null=True)
+    taker_order_id = models.UUIDField(null=True)
+    maker_user_id = models.UUIDField(null=True)
+    taker_user_id = models.UUIDField(null=True)
+
+    class Meta:
+        # Окно статистики (orders/stats.py); лента тикера и курсор since по seq
+        indexes = [models.Index(fields=["timestamp"]), models.Index(fields=["ticker", "seq"])]
+
+
+class Execution(models.Model):
+    """Исполнение с точки зрения одного участника: на сделку две записи.
+
+    seq — номер сделки, курсор ленты исполнений (since в /api/v1/executions),
+    как у /transactions; индекс (user_id, seq) превращает опрос новых
+    исполнений в один range scan. У самосделки две записи с одним seq.
+    """
+    MAKER = "MAKER"
+    TAKER = "TAKER"
+
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.UUIDField()
+    trade_id = models.BigIntegerField()
+    order_id = models.UUIDField()
+    ticker = models.CharField(max_length=16)
+    direction = models.CharField(max_length=4)
+    liquidity = models.CharField(max_length=5, choices=[(MAKER, MAKER), (TAKER, TAKER)])
+    qty = models.PositiveIntegerField()
+    price_ticks = models.BigIntegerField()
+    timestamp = models.DateTimeField()
+    seq = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user_id", "seq"])]
+
+class PendingMatch(models.Model):
+    """Очередь ордеров, принятых в async-режиме и ещё не прошедших матчинг"""
+    LIMIT = "LIMIT"
+    MARKET = "MARKET"
+
+    order_id = models.UUIDField(unique=True)
+    order_type = models.CharField(max_length=6, choices=[(LIMIT, LIMIT), (MARKET, MARKET)])
+    ticker = models.CharField(max_length=16, db_index=True)
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+
+
+class ArchivedOrder(models.Model):
+    """Холодная копия ордера в терминальном состоянии (см. manage.py archive_orders)"""
+    LIMIT = "LIMIT"
+    MARKET = "MARKET"
+
+    id = models.UUIDField(primary_key=True)
+    order_type = models.CharField(max_length=6, choices=[(LIMIT, LIMIT), (MARKET, MARKET)])
+    user_id = models.UUIDField(db_index=True)
+    ticker = models.CharField(max_length=16)
+    direction = models.CharField(max_length=4)
+    price_ticks = models.BigIntegerField(null=True)
+    qty = models.PositiveIntegerField()
+    filled = models.PositiveIntegerField()
+    status = models.CharField(max_length=32)
+    created_at = models.DateTimeField()
+    seq = models.BigIntegerField(null=True)
+
+
+class ArchivedTransaction(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    seq = models.BigIntegerField(null=True)
+    ticker = models.CharField(max_length=16)
+    amount = models.PositiveIntegerField()
+    price_ticks = models.BigIntegerField()
+    timestamp = models.DateTimeField()
+    maker_order_id = models.UUIDField(null=True)
+    taker_order_id = models.UUIDField(null=True)
+    maker_user_id = models.UUIDField(null=True)
+    taker_user_id = models.UUIDField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["ticker", "seq"])]
@@ -1,7 +1,26 @@
 from rest_framework import serializers
-from .models import MarketOrder, LimitOrder
+from .models import MarketOrder, LimitOrder, OrderStatus
+from instruments.models import Instrument
+
+
+class InstrumentOrderMixin:
+    """Проверяет тикер и лот; найденный инструмент доступен view как serializer.instrument"""
+    qty_field = None
+
+    def validate(self, attrs):
+        self.instrument = Instrument.objects.filter(ticker=attrs["ticker"]).first()
+        if self.instrument is None:
+            raise serializers.ValidationError({"ticker": "Unknown instrument"})
+        if self.instrument.halted:
+            raise serializers.ValidationError({"ticker": "Trading halted"})
+        if attrs[self.qty_field] % self.instrument.lot_size:
+            raise serializers.ValidationError({self.qty_field: f"Quantity must be a multiple of lot size {self.instrument.lot_size}"})
+        return attrs
+
+
+class MarketOrderCreateSerializer(InstrumentOrderMixin, serializers.ModelSerializer):
+    qty_field = "qty"
 
-class MarketOrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = MarketOrder
         fields = ("ticker", "direction", "qty")
@@ -10,11 +29,24 @@ class MarketOrderCreateSerializer(serializers.ModelSerializer):
         return MarketOrder.objects.create(**validated_data, status=OrderStatus.NEW)
 
 
-class LimitOrderCreateSerializer(serializers.ModelSerializer):
+class LimitOrderCreateSerializer(InstrumentOrderMixin, serializers.ModelSerializer):
+    qty_field = "original_qty"
+    price = serializers.DecimalField(max_digits=20, decimal_places=4, min_value=0, write_only=True)
+
     class Meta:
         model = LimitOrder
         fields = ("ticker", "direction", "price", "original_qty")
 
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        try:
+            attrs["price_ticks"] = self.instrument.to_ticks(attrs.pop("price"))
+        except ValueError:
+            raise serializers.ValidationError({"price": f"Price must be a multiple of tick size {self.instrument.tick_size}"})
+        if attrs["price_ticks"] <= 0:
+            raise serializers.ValidationError({"price": "Price must be positive"})
+        return attrs
+
     def create(self, validated_data):
         return LimitOrder.objects.create(**validated_data, status=OrderStatus.NEW, filled=0)
 
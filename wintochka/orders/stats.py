@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.db.models import Max
+
+from .models import Transaction
+
+# Скользящая 24h-статистика по тикерам: на тикер кольцевой буфер из 1440
+# минутных корзин [minute, open, high, low, close, volume, trades]. Сводка
+# по тикеру обходит фиксированное число корзин и не зависит от числа сделок.
+#
+# Перед каждым ответом буфер дочитывает сделки с seq больше последнего
+# применённого. seq выдаётся в транзакции сделки (EventSequence), а писатель
+# в SQLite один, поэтому номера коммитятся по возрастанию: позже курсора
+# закоммитить сделку с меньшим seq нельзя. Пропуски в нумерации (неизрасходованные
+# номера EventSequence.block) курсору не мешают. Буфер заполняется из БД при
+# первом обращении в процессе, а не в AppConfig.ready(): там ходить в БД нельзя
+# (migrate, collectstatic).
+
+WINDOW_MINUTES = 24 * 60
+MINUTE, OPEN, HIGH, LOW, CLOSE, VOLUME, TRADES = range(7)
+
+
+class TickerRing:
+    def __init__(self):
+        self.slots = [None] * WINDOW_MINUTES
+
+    def add(self, minute, price_ticks, qty):
+        index = minute % WINDOW_MINUTES
+        slot = self.slots[index]
+        if slot is None or slot[MINUTE] != minute:
+            if slot is not None and slot[MINUTE] > minute:
+                return  # сделка старше окна
+            self.slots[index] = [minute, price_ticks, price_ticks, price_ticks, price_ticks, qty, 1]
+            return
+        slot[HIGH] = max(slot[HIGH], price_ticks)
+        slot[LOW] = min(slot[LOW], price_ticks)
+        slot[CLOSE] = price_ticks
+        slot[VOLUME] += qty
+        slot[TRADES] += 1
+
+    def summary(self, now_minute):
+        """dict в тиках; None, если за 24 часа сделок не было"""
+        live = [s for s in self.slots if s is not None and s[MINUTE] > now_minute - WINDOW_MINUTES]
+        if not live:
+            return None
+        first = min(live, key=lambda s: s[MINUTE])
+        last = max(live, key=lambda s: s[MINUTE])
+        return {
+            "open": first[OPEN],
+            "high": max(s[HIGH] for s in live),
+            "low": min(s[LOW] for s in live),
+            "last": last[CLOSE],
+            "volume": sum(s[VOLUME] for s in live),
+            "trades": sum(s[TRADES] for s in live),
+        }
+
+
+def _minute(timestamp):
+    return int(timestamp.timestamp() // 60)
+
+
+class TickerStatsBook:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rings = {}
+        # seq последней применённой сделки; None — буфер ещё не загружен
+        self._last_seq = None
+
+    def refresh(self):
+        with self._lock:
+            last_seq = self._last_seq
+        fields = ("seq", "ticker", "price_ticks", "amount", "timestamp")
+        # Запросы — без лока: ответы других потоков не ждут БД
+        if last_seq is None:
+            since = datetime.fromtimestamp(time.time() - WINDOW_MINUTES * 60, tz=timezone.utc)
+            trades = list(Transaction.objects.filter(timestamp__gte=since).order_by("seq").values_list(*fields))
+            if trades:
+                top = trades[-1][0]
+            else:
+                top = Transaction.objects.aggregate(top=Max("seq"))["top"] or 0
+        else:
+            trades = list(Transaction.objects.filter(seq__gt=last_seq).order_by("seq").values_list(*fields))
+            top = trades[-1][0] if trades else last_seq
+        with self._lock:
+            # Параллельный refresh мог уже применить часть этих сделок
+            applied = self._last_seq if self._last_seq is not None else -1
+            for seq, ticker, price_ticks, qty, timestamp in trades:
+                if seq <= applied:
+                    continue
+                ring = self._rings.get(ticker)
+                if ring is None:
+                    ring = self._rings[ticker] = TickerRing()
+                ring.add(_minute(timestamp), price_ticks, qty)
+            if self._last_seq is None or top > self._last_seq:
+                self._last_seq = top
+
+    def summary(self, ticker):
+        now_minute = int(time.time() // 60)
+        with self._lock:
+            ring = self._rings.get(ticker)
+            return ring.summary(now_minute) if ring is not None else None
+
+    def reset(self):
+        with self._lock:
+            self._rings = {}
+            self._last_seq = None
+
+
+ticker_stats = TickerStatsBook()
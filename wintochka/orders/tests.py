@@ -1,3 +1,429 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from uuid import UUID
 
-# Create your tests here.
+from django.db import OperationalError
+from django.utils import timezone
+
+from balances.models import Balance
+from instruments.models import Instrument
+from orders import delisting, intake, marketdata
+from orders.archive import archive_before
+from orders.engine import OrderMatchingEngine
+from orders.stats import ticker_stats
+from orders.models import (
+    ArchivedOrder, ArchivedTransaction, EventSequence, Execution, LimitOrder, MarketOrder, OrderStatus, PendingMatch,
+    Transaction,
+)
+from orders.serializers import LimitOrderCreateSerializer
+from wintochka.testing import QueryBudgetTestCase
+
+
+class OrderEntryQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.instrument = self.make_instrument("MEM")
+        self.buyer = self.make_user("buyer", RUB=10 ** 9)
+        self.seller = self.make_user("seller", MEM=10 ** 6)
+
+    def rest(self, ticker, count, direction="SELL", user=None):
+        LimitOrder.objects.bulk_create(
+            LimitOrder(
+                user=user or self.seller, ticker=ticker, direction=direction, price_ticks=100 + i,
+                original_qty=1, filled=0, status=OrderStatus.NEW, seq=EventSequence.next(),
+            )
+            for i in range(count)
+        )
+
+    def test_resting_limit_order(self):
+        self.request(11, "post", "/api/v1/order", self.buyer,
+                     {"ticker": "MEM", "direction": "BUY", "original_qty": 1, "price": 1}, status=201)
+
+    def test_limit_order_async_intake(self):
+        with self.settings(ORDER_INTAKE_MODE="async"):
+            self.request(11, "post", "/api/v1/order", self.buyer,
+                         {"ticker": "MEM", "direction": "BUY", "original_qty": 1, "price": 1}, status=202)
+
+    def test_market_order_crossing_levels(self):
+        def market_order_crossing(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            self.rest(ticker, size)
+            queries = self.capture("post", "/api/v1/order", self.buyer,
+                                   {"ticker": ticker, "direction": "BUY", "qty": size}, status=201)
+            self.assertEqual(queries.response.json()["filled"], size)
+            return queries
+
+        self.assertScales(market_order_crossing, base=19, per_item=11)
+
+    def test_limit_order_crossing_levels(self):
+        def limit_order_crossing(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            self.rest(ticker, size)
+            return self.capture("post", "/api/v1/order", self.buyer,
+                                {"ticker": ticker, "direction": "BUY", "original_qty": size, "price": 1000}, status=201)
+
+        self.assertScales(limit_order_crossing, base=21, per_item=10)
+
+    def test_order_detail_and_cancel(self):
+        self.rest("MEM", 1, direction="BUY", user=self.buyer)
+        order = LimitOrder.objects.get()
+        self.request(4, "get", f"/api/v1/order/{order.id}", self.buyer, status=200)
+        self.request(9, "delete", f"/api/v1/order/{order.id}", self.buyer, status=200)
+
+    def test_cancel_failures_are_not_masked(self):
+        self.rest("MEM", 1, direction="BUY", user=self.buyer)
+        order = LimitOrder.objects.get()
+        path = f"/api/v1/order/{order.id}"
+        # Занятая БД — 503, который можно повторить: транзакция откатилась
+        with mock.patch.object(OrderMatchingEngine, "cancel_order", side_effect=OperationalError("database is locked")):
+            response = self.capture("delete", path, self.buyer, status=503).response
+        self.assertEqual(response["Retry-After"], "1")
+        # Остальное — настоящая ошибка, а не безликий 500 из view
+        with mock.patch.object(OrderMatchingEngine, "cancel_order", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                self.client.delete(path, HTTP_AUTHORIZATION=f"TOKEN {self.buyer.api_key}")
+
+
+class ArchiveTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_instrument("MEM")
+        self.buyer = self.make_user("buyer", RUB=10 ** 6)
+        self.seller = self.make_user("seller", MEM=100)
+
+    def order(self, user, data, status=201):
+        data = {"ticker": "MEM", **data}
+        return self.capture("post", "/api/v1/order", user, data, status=status).response.json()["order_id"]
+
+    def detail(self, order_id):
+        return self.capture("get", f"/api/v1/order/{order_id}", self.buyer, status=200).response.json()
+
+    def test_archive_moves_only_terminal_orders_and_old_trades(self):
+        resting = self.order(self.seller, {"direction": "SELL", "original_qty": 3, "price": 100})
+        market = self.order(self.buyer, {"direction": "BUY", "qty": 1})
+        cancelled = self.order(self.buyer, {"direction": "BUY", "original_qty": 1, "price": 90})
+        self.capture("delete", f"/api/v1/order/{cancelled}", self.buyer, status=200)
+        open_buy = self.order(self.buyer, {"direction": "BUY", "original_qty": 1, "price": 80})
+        before = {order_id: self.detail(order_id) for order_id in (market, cancelled)}
+
+        # Пачка по одной строке: курсор по pk обходит таблицу один раз
+        moved = archive_before(timezone.now() + timedelta(seconds=1), batch_size=1)
+        self.assertEqual(moved, {"limit_orders": 1, "market_orders": 1, "transactions": 1})
+        self.assertEqual(set(LimitOrder.objects.values_list("id", flat=True)), {UUID(resting), UUID(open_buy)})
+        self.assertFalse(MarketOrder.objects.exists())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.assertEqual(ArchivedTransaction.objects.count(), 1)
+
+        # Архивный ордер отдаётся тем же ответом, что и до переноса
+        for order_id, data in before.items():
+            self.assertEqual(self.detail(order_id), data)
+        self.assertEqual(self.detail(cancelled)["price"], 90)
+        self.capture("get", f"/api/v1/order/{cancelled}", self.seller, status=404)
+
+    def test_transactions_topped_up_from_archive(self):
+        self.order(self.seller, {"direction": "SELL", "original_qty": 3, "price": 100})
+        self.order(self.buyer, {"direction": "BUY", "qty": 1})
+        archive_before(timezone.now() + timedelta(seconds=1))
+        self.order(self.buyer, {"direction": "BUY", "qty": 2})
+
+        feed = self.client.get("/api/v1/transactions/MEM").json()
+        self.assertEqual([item["amount"] for item in feed], [2, 1])
+        self.assertEqual([item["seq"] for item in feed], sorted((item["seq"] for item in feed), reverse=True))
+        self.assertEqual(len(self.client.get("/api/v1/transactions/MEM?limit=1").json()), 1)
+
+
+class DelistingRaceTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_instrument("MEM")
+        self.buyer = self.make_user("buyer", RUB=1000)
+
+    def test_order_validated_before_halt_is_rejected(self):
+        save = LimitOrderCreateSerializer.save
+
+        def halt_then_save(serializer, **kwargs):
+            # Делистинг остановил торги между валидацией и транзакцией ордера
+            Instrument.objects.filter(ticker="MEM").update(halted=True)
+            return save(serializer, **kwargs)
+
+        with mock.patch.object(LimitOrderCreateSerializer, "save", halt_then_save):
+            self.capture("post", "/api/v1/order", self.buyer,
+                         {"ticker": "MEM", "direction": "BUY", "original_qty": 10, "price": 5}, status=400)
+        self.assertFalse(LimitOrder.objects.exists())
+        self.assertEqual(Balance.objects.get(user=self.buyer, ticker="RUB").amount, 1000)
+
+    def test_delete_sweeps_orders_committed_after_delisting(self):
+        self.capture("post", "/api/v1/order", self.buyer,
+                     {"ticker": "MEM", "direction": "BUY", "original_qty": 10, "price": 5}, status=201)
+        cancel_all = delisting._cancel_all
+        passes = []
+
+        def late_commit(instrument, chunk_size):
+            # Пачки делистинга ордер не застали: он закоммитился после последней
+            passes.append(instrument)
+            return 0 if len(passes) == 1 else cancel_all(instrument, chunk_size)
+
+        with mock.patch.object(delisting, "_cancel_all", side_effect=late_commit):
+            response = self.capture("delete", "/api/v1/admin/instrument/MEM", self.admin, status=200).response
+        self.assertEqual(response.json()["cancelled_orders"], 1)
+        self.assertEqual(LimitOrder.objects.get().status, OrderStatus.CANCELLED)
+        self.assertEqual(Balance.objects.get(user=self.buyer, ticker="RUB").amount, 1000)
+        self.assertFalse(Instrument.objects.exists())
+
+
+class MatchBatchFallbackTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_instrument("MEM")
+        self.buyer = self.make_user("buyer", RUB=1000)
+        with self.settings(ORDER_INTAKE_MODE="async"):
+            for price in (1, 2):
+                self.capture("post", "/api/v1/order", self.buyer,
+                             {"ticker": "MEM", "direction": "BUY", "original_qty": 10, "price": price}, status=202)
+        self.bad, self.good = LimitOrder.objects.order_by("price_ticks")
+        self.entries = list(PendingMatch.objects.order_by("id"))
+        self.match_order = OrderMatchingEngine.match_order
+
+    def test_failing_order_is_rejected_with_refund(self):
+        def match_order(order, instrument=None):
+            if order.id == self.bad.id:
+                raise RuntimeError("broken order")
+            return self.match_order(order, instrument)
+
+        with mock.patch.object(OrderMatchingEngine, "match_order", side_effect=match_order):
+            intake.match_batch(self.entries)
+        self.assertEqual(LimitOrder.objects.get(id=self.bad.id).status, OrderStatus.CANCELLED)
+        self.assertEqual(LimitOrder.objects.get(id=self.good.id).status, OrderStatus.NEW)
+        self.assertEqual(Balance.objects.get(user=self.buyer, ticker="RUB").amount, 1000 - 20)
+        self.assertFalse(PendingMatch.objects.exists())
+
+    def test_locked_database_keeps_orders_queued(self):
+        # Пачка падает целиком, а при разборе по одному БД оказывается занята
+        errors = [RuntimeError("broken batch"), OperationalError("database is locked")]
+        with mock.patch.object(OrderMatchingEngine, "match_order", side_effect=errors):
+            with self.assertRaises(OperationalError):
+                intake.match_batch(self.entries)
+        self.assertEqual(PendingMatch.objects.count(), 2)
+        self.assertEqual(LimitOrder.objects.get(id=self.bad.id).status, OrderStatus.NEW)
+
+
+class NotionalTest(QueryBudgetTestCase):
+    def test_cancel_refunds_quantity_off_lot(self):
+        # Ордер старше лотов: 4 штуки при lot_size 10 — резерв возвращается целиком
+        self.make_instrument("MEM", lot_size=10)
+        buyer = self.make_user("buyer", RUB=0)
+        order = LimitOrder.objects.create(user=buyer, ticker="MEM", direction="BUY", price_ticks=100,
+                                          original_qty=4, filled=0, status=OrderStatus.NEW)
+        self.assertTrue(OrderMatchingEngine.cancel_order(order))
+        self.assertEqual(Balance.objects.get(user=buyer, ticker="RUB").amount, 400)
+
+    def test_fractional_cost_is_an_error(self):
+        instrument = self.make_instrument("MEM", tick_size=Decimal("0.5"), lot_size=2)
+        self.assertEqual(instrument.notional(2, 201), 201)
+        with self.assertRaises(ValueError):
+            instrument.notional(1, 201)
+
+
+class EventSequenceTest(QueryBudgetTestCase):
+    def test_bulk_create_numbers_rows(self):
+        user = self.make_user("trader")
+        first = EventSequence.next()
+        with self.assertNumQueries(2):
+            orders = LimitOrder.objects.bulk_create(
+                LimitOrder(user=user, ticker="MEM", direction="SELL", price_ticks=100, original_qty=1, status=OrderStatus.NEW)
+                for _ in range(3)
+            )
+        self.assertEqual([order.seq for order in orders], [first + 1, first + 2, first + 3])
+        self.assertEqual(EventSequence.next(), first + 4)
+
+    def test_block_reserves_growing_ranges(self):
+        seqs = EventSequence.block(limit=4)
+        with self.assertNumQueries(4):
+            taken = [next(seqs) for _ in range(11)]
+        self.assertEqual(taken, list(range(taken[0], taken[0] + 11)))
+        self.assertGreater(EventSequence.next(), taken[-1])
+
+
+class MarketDataQueryBudgetTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user("trader")
+        # Первое обращение грузит окно 24ч целиком; в сценариях меряем дочитывание
+        ticker_stats.refresh()
+
+    def test_orderbook(self):
+        def orderbook(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            for direction in ("BUY", "SELL"):
+                LimitOrder.objects.bulk_create(
+                    LimitOrder(user=self.user, ticker=ticker, direction=direction, price_ticks=100 + i,
+                               original_qty=1, filled=0, status=OrderStatus.NEW)
+                    for i in range(size)
+                )
+            return self.capture("get", f"/api/v1/orderbook/{ticker}?limit=25", status=200)
+
+        self.assertScales(orderbook, base=3)
+
+    def trades(self, ticker, count):
+        Transaction.objects.bulk_create(
+            Transaction(ticker=ticker, amount=1, price_ticks=100 + i) for i in range(count)
+        )
+
+    def test_transactions(self):
+        def transactions(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            self.trades(ticker, size)
+            return self.capture("get", f"/api/v1/transactions/{ticker}?limit=100", status=200)
+
+        # Меньше limit сделок в горячей таблице — дочитываем архив отдельным запросом
+        self.assertScales(transactions, base=3, sizes=(1, 10, 99))
+
+    def test_transactions_newest_by_seq(self):
+        self.make_instrument("MEM")
+        self.trades("MEM", 3)
+        # Часы писателей расходятся: timestamp не совпадает с порядком коммита
+        Transaction.objects.update(timestamp=timezone.now())
+        Transaction.objects.filter(seq=Transaction.objects.order_by("seq").values("seq")[:1]).update(
+            timestamp=timezone.now() + timedelta(seconds=5)
+        )
+        feed = self.client.get("/api/v1/transactions/MEM").json()
+        seqs = list(Transaction.objects.order_by("-seq").values_list("seq", flat=True))
+        self.assertEqual([item["seq"] for item in feed], seqs)
+
+    def test_ticker_stats(self):
+        def all_tickers(size):
+            for i in range(size):
+                self.make_instrument(f"T{size}N{i}")
+            return self.capture("get", "/api/v1/ticker", status=200)
+
+        def one_ticker(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            self.trades(ticker, size)
+            ticker_stats_queries = self.capture("get", f"/api/v1/ticker/{ticker}", status=200)
+            self.assertEqual(ticker_stats_queries.response.json()["trades_24h"], size)
+            return ticker_stats_queries
+
+        self.assertScales(all_tickers, base=3)
+        # Дочитывание новых сделок — один запрос независимо от их числа
+        self.assertScales(one_ticker, base=3)
+
+    def test_ticker_stats_seq_cursor(self):
+        self.make_instrument("MEM")
+        Transaction.objects.create(ticker="MEM", amount=1, price_ticks=100)
+        ticker_stats.refresh()
+        # Дочитываются только сделки после курсора, и каждая — один раз
+        Transaction.objects.create(ticker="MEM", amount=1, price_ticks=100)
+        ticker_stats.refresh()
+        ticker_stats.refresh()
+        self.assertEqual(self.client.get("/api/v1/ticker/MEM").json()["trades_24h"], 2)
+
+    def test_instruments(self):
+        def instruments(size):
+            for i in range(size):
+                self.make_instrument(f"T{size}N{i}")
+            return self.capture("get", "/api/v1/instruments", status=200)
+
+        self.assertScales(instruments, base=1)
+
+    def test_executions(self):
+        def executions(size):
+            ticker = self.ticker_for(size)
+            self.make_instrument(ticker)
+            Execution.objects.bulk_create(
+                Execution(user_id=self.user.id, trade_id=i, order_id=self.user.id, ticker=ticker, direction="BUY",
+                          liquidity=Execution.TAKER, qty=1, price_ticks=100, seq=EventSequence.next(),
+                          timestamp=timezone.now())
+                for i in range(size)
+            )
+            return self.capture("get", "/api/v1/executions?limit=500", self.user, status=200)
+
+        self.assertScales(executions, base=3)
+
+    def test_executions_paging(self):
+        self.make_instrument("MEM")
+        Execution.objects.bulk_create(
+            Execution(user_id=self.user.id, trade_id=seq, order_id=self.user.id, ticker="MEM", direction="BUY",
+                      liquidity=liquidity, qty=1, price_ticks=100, seq=seq, timestamp=timezone.now())
+            for seq, liquidity in ((1, Execution.TAKER), (2, Execution.MAKER), (2, Execution.TAKER), (3, Execution.TAKER))
+        )
+
+        def page(since, limit):
+            response = self.client.get(f"/api/v1/executions?since={since}&limit={limit}",
+                                       HTTP_AUTHORIZATION=f"TOKEN {self.user.api_key}").json()
+            return [execution["seq"] for execution in response["executions"]], response["next_since"]
+
+        # Самосделка целиком на одной странице, даже если не влезает в limit
+        self.assertEqual(page(0, 2), ([1], 1))
+        self.assertEqual(page(1, 1), ([2, 2], 2))
+        self.assertEqual(page(2, 10), ([3], 3))
+        self.assertEqual(page(3, 10), ([], 3))
+
+
+class SharedMarketDataTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        market_data = self.settings(MARKET_DATA_DIR=directory.name)
+        market_data.enable()
+        self.addCleanup(market_data.disable)
+
+        self.instrument = self.make_instrument("MEM", tick_size=Decimal("0.5"), lot_size=2)
+        self.buyer = self.make_user("buyer", RUB=10 ** 9)
+        self.seller = self.make_user("seller", MEM=10 ** 6)
+        for price, qty in (("100", 4), ("100.5", 2), ("101", 2)):
+            self.capture("post", "/api/v1/order", self.seller,
+                         {"ticker": "MEM", "direction": "SELL", "original_qty": qty, "price": price}, status=201)
+        self.capture("post", "/api/v1/order", self.buyer,
+                     {"ticker": "MEM", "direction": "BUY", "qty": 6}, status=201)
+        self.capture("post", "/api/v1/order", self.buyer,
+                     {"ticker": "MEM", "direction": "BUY", "original_qty": 2, "price": "99.5"}, status=201)
+
+    def from_database(self, path):
+        with self.settings(MARKET_DATA_DIR=None):
+            return self.client.get(path).content
+
+    def test_served_from_shared_memory(self):
+        for path in ("/api/v1/orderbook/MEM", "/api/v1/orderbook/MEM?limit=1", "/api/v1/orderbook/MEM?limit=0",
+                     "/api/v1/transactions/MEM", "/api/v1/transactions/MEM?limit=1", "/api/v1/transactions/MEM?limit=100"):
+            response = self.request(0, "get", path, status=200)
+            self.assertEqual(response.content, self.from_database(path), path)
+
+    def test_ticker_best_prices_from_snapshot(self):
+        queries = self.capture("get", "/api/v1/ticker/MEM", status=200)
+        self.assertFalse([q for q in queries if "orders_limitorder" in q["sql"]])
+        body = queries.response.json()
+        self.assertEqual(queries.response.content, self.from_database("/api/v1/ticker/MEM"))
+        self.assertEqual((body["best_bid"], body["best_ask"]), (99.5, 101))
+
+    def test_cancel_and_delist_republish(self):
+        order = LimitOrder.objects.get(direction="BUY")
+        self.capture("delete", f"/api/v1/order/{order.id}", self.buyer, status=200)
+        self.assertEqual(self.request(0, "get", "/api/v1/orderbook/MEM", status=200).content,
+                         self.from_database("/api/v1/orderbook/MEM"))
+
+        self.capture("delete", "/api/v1/admin/instrument/MEM", self.admin, status=200)
+        self.assertEqual(self.client.get("/api/v1/orderbook/MEM").json(), {"bids": [], "asks": []})
+        self.assertEqual(self.client.get("/api/v1/transactions/MEM").json(), [])
+
+    def test_region_from_previous_process_is_reseeded(self):
+        # Новый процесс находит файл от старого, а БД поменяли в обход публикаций
+        LimitOrder.objects.filter(direction="BUY").update(status=OrderStatus.CANCELLED)
+        with mock.patch.object(marketdata, "regions", marketdata.MarketDataRegions()):
+            self.assertEqual(self.client.get("/api/v1/orderbook/MEM").content, self.from_database("/api/v1/orderbook/MEM"))
+            self.request(0, "get", "/api/v1/orderbook/MEM", status=200)
+
+    def test_failed_publish_retires_region(self):
+        LimitOrder.objects.filter(direction="BUY").update(status=OrderStatus.CANCELLED)
+        with mock.patch.object(marketdata, "load_orderbook", side_effect=OperationalError("database is locked")):
+            marketdata._pending.tickers = {"MEM"}
+            marketdata._flush()
+        self.assertIsNone(marketdata.regions.read("MEM"))
+        self.assertEqual(self.client.get("/api/v1/orderbook/MEM").content, self.from_database("/api/v1/orderbook/MEM"))
@@ -1,112 +1,55 @@
 import logging
-from uuid import UUID
+
 from django.db import transaction
-from django.db.models import Sum, F, ExpressionWrapper, IntegerField
+from django.db.models import Q, Max, Min
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 
-from .models import MarketOrder, LimitOrder, OrderStatus, Transaction
+from .models import (
+    MarketOrder,
+    LimitOrder,
+    OrderStatus,
+    Transaction,
+    Execution,
+    PendingMatch,
+    ArchivedOrder,
+)
+from .engine import OrderMatchingEngine
+from .stats import ticker_stats
+from . import intake, marketdata
 from .serializers import (
     MarketOrderCreateSerializer,
     LimitOrderCreateSerializer,
-    OrderbookSerializer
+)
+from .encoders import (
+    JSONBytesResponse,
+    encode_orderbook,
+    encode_transactions,
+    encode_instruments,
+    encode_balances_detailed,
+    encode_ticker_stats,
+    encode_executions,
 )
 from users.permissions import HasAPIKey
+from users.throttling import (
+    OrderEntryThrottle,
+    CancelThrottle,
+    MarketDataThrottle,
+    MatchingBackpressureThrottle,
+    store as ratelimit_store,
+)
 from users.utils import get_user_from_token
 from balances.models import Balance
 from instruments.models import Instrument
 
 logger = logging.getLogger(__name__)
 
-class OrderMatchingEngine:
-    @staticmethod
-    def execute_trade(buy_order, sell_order, qty, price):
-        with transaction.atomic():
-            cost = qty * price
-
-            buyer_rub = Balance.objects.select_for_update().get(user=buy_order.user, ticker="RUB")
-            seller_asset = Balance.objects.select_for_update().get(user=sell_order.user, ticker=sell_order.ticker)
-
-            if buyer_rub.amount < cost:
-                raise ValidationError("Недостаточно средств у покупателя")
-            if seller_asset.amount < qty:
-                raise ValidationError("Недостаточно активов у продавца")
-
-            seller_rub, _ = Balance.objects.get_or_create(user=sell_order.user, ticker="RUB")
-            buyer_asset, _ = Balance.objects.get_or_create(user=buy_order.user, ticker=sell_order.ticker)
-
-            buyer_rub.amount -= cost
-            seller_asset.amount -= qty
-            seller_rub.amount += cost
-            buyer_asset.amount += qty
-
-            buyer_rub.save()
-            seller_asset.save()
-            seller_rub.save()
-            buyer_asset.save()
-
-            Transaction.objects.create(ticker=sell_order.ticker, amount=qty, price=price)
-
-            logger.info(f"Trade executed: {qty} {sell_order.ticker} @ {price} | buyer={buy_order.user.id}, seller={sell_order.user.id}")
-
-    @staticmethod
-    def match_order(order):
-        logger.info(f"Matching started for order {order.id}")
-
-        if isinstance(order, MarketOrder):
-            if order.direction == "BUY":
-                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="SELL", status="NEW").order_by("price", "created_at")
-            else:
-                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="BUY", status="NEW").order_by("-price", "created_at")
-        else:
-            if order.direction == "BUY":
-                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="SELL", status="NEW", price__lte=order.price).order_by("price", "created_at")
-            else:
-                counter_orders = LimitOrder.objects.filter(ticker=order.ticker, direction="BUY", status="NEW", price__gte=order.price).order_by("-price", "created_at")
-
-        total_filled = 0
-
-        for counter_order in counter_orders:
-            if order.filled >= order.original_qty:
-                break
-
-            fillable = min(order.original_qty - order.filled, counter_order.original_qty - counter_order.filled)
-            if fillable <= 0:
-                continue
-
-            try:
-                OrderMatchingEngine.execute_trade(
-                    buy_order=order if order.direction == "BUY" else counter_order,
-                    sell_order=counter_order if order.direction == "BUY" else order,
-                    qty=fillable,
-                    price=counter_order.price
-                )
-
-                order.filled += fillable
-                counter_order.filled += fillable
-
-                counter_order.status = "EXECUTED" if counter_order.filled == counter_order.original_qty else "PARTIALLY_EXECUTED"
-                counter_order.save()
-                total_filled += fillable
-
-            except ValidationError as e:
-                logger.warning(f"Skipping trade due to: {str(e)}")
-                continue
-
-        order.status = (
-            "EXECUTED" if order.filled == order.original_qty
-            else "PARTIALLY_EXECUTED" if order.filled > 0 else "NEW"
-        )
-        order.save()
-
-        logger.info(f"Matching finished for order {order.id}: filled={order.filled}, status={order.status}")
-        return total_filled
-
 class OrderCreateView(APIView):
     permission_classes = [HasAPIKey]
+    throttle_classes = [OrderEntryThrottle, MatchingBackpressureThrottle]
 
     def post(self, request):
         is_market = 'price' not in request.data
@@ -116,11 +59,16 @@ class OrderCreateView(APIView):
 
         try:
             with transaction.atomic():
-                order = serializer.save(user=request.user)
+                order = serializer.save(user=get_user_from_token(request))
+                # Вставка ордера взяла лок записи БД, так что остановка торгов уже
+                # либо видна здесь, либо закоммитится после нас и снимет этот ордер
+                instrument = Instrument.objects.filter(ticker=order.ticker).first()
+                if instrument is None or instrument.halted:
+                    raise ValidationError("Trading halted")
 
                 if isinstance(order, LimitOrder):
                     if order.direction == "BUY":
-                        cost = order.price * order.original_qty
+                        cost = instrument.notional(order.original_qty, order.price_ticks)
                         balance = Balance.objects.select_for_update().get(user=order.user, ticker="RUB")
                         if balance.amount < cost:
                             raise ValidationError("Недостаточно средств")
@@ -133,78 +81,179 @@ class OrderCreateView(APIView):
                         asset.amount -= order.original_qty
                         asset.save()
 
-                filled = OrderMatchingEngine.match_order(order)
-                return Response({"order_id": str(order.id), "filled": filled, "status": order.status}, status=201)
+                if intake.is_async():
+                    intake.enqueue(order)
+                    return Response({"order_id": str(order.id), "seq": order.seq, "status": order.status}, status=202)
+
+                with ratelimit_store.inflight():
+                    filled = OrderMatchingEngine.match_order(order, instrument)
+                return Response({"order_id": str(order.id), "seq": order.seq, "filled": filled, "status": order.status}, status=201)
 
         except ValidationError as e:
             return Response({"error": str(e)}, status=400)
 
-class OrderCancelView(APIView):
+class OrderDetailView(APIView):
     permission_classes = [HasAPIKey]
 
-    def delete(self, request, order_id):
-        try:
-            UUID(order_id)
-        except ValueError:
-            return Response({"error": "Invalid UUID"}, status=400)
+    def get_throttles(self):
+        if self.request.method == "DELETE":
+            return [CancelThrottle()]
+        return [MarketDataThrottle()]
 
-        order = get_object_or_404(LimitOrder, id=order_id, user=request.user)
-        if order.status != "NEW":
-            return Response({"error": "Only NEW orders can be cancelled"}, status=400)
+    def get(self, request, order_id):
+        user = get_user_from_token(request)
+        order = LimitOrder.objects.filter(id=order_id, user=user).first()
+        if order is None:
+            order = MarketOrder.objects.filter(id=order_id, user=user).first()
 
-        try:
-            with transaction.atomic():
-                remaining = order.original_qty - order.filled
-                if order.direction == "BUY":
-                    refund = order.price * remaining
-                    Balance.objects.filter(user=order.user, ticker="RUB").update(amount=F('amount') + refund)
-                else:
-                    Balance.objects.filter(user=order.user, ticker=order.ticker).update(amount=F('amount') + remaining)
-
-                order.status = "CANCELLED"
-                order.save()
-                logger.info(f"Order {order.id} cancelled")
-                return Response({"success": True})
-        except Exception as e:
-            logger.error(f"Cancel error: {e}")
-            return Response({"error": "Server error"}, status=500)
+        if order is not None:
+            is_limit = isinstance(order, LimitOrder)
+            queued = PendingMatch.objects.filter(order_id=order.id).exists()
+        else:
+            # Терминальные ордера после archive_orders живут только в архиве
+            order = get_object_or_404(ArchivedOrder, id=order_id, user_id=user.id)
+            is_limit = order.order_type == ArchivedOrder.LIMIT
+            queued = False
+
+        data = {
+            "id": str(order.id),
+            "seq": order.seq,
+            "status": order.status,
+            "ticker": order.ticker,
+            "direction": order.direction,
+            "qty": order.original_qty if not isinstance(order, ArchivedOrder) else order.qty,
+            "filled": order.filled,
+            "queued": queued,
+            "timestamp": order.created_at.isoformat(),
+        }
+        if is_limit:
+            # После делистинга инструмента цену в деньгах восстановить не из чего
+            instrument = Instrument.objects.filter(ticker=order.ticker).first()
+            data["price"] = instrument.from_ticks(order.price_ticks) if instrument else None
+        return Response(data)
 
-class OrderBookView(APIView):
-    def get(self, request, ticker):
-        limit = min(int(request.query_params.get("limit", 10)), 25)
-        orders = LimitOrder.objects.filter(ticker=ticker, status="NEW").annotate(
-            remaining_qty=ExpressionWrapper(F("original_qty") - F("filled"), output_field=IntegerField())
-        ).filter(remaining_qty__gt=0)
+    def delete(self, request, order_id):
+        order = get_object_or_404(LimitOrder, id=order_id, user=get_user_from_token(request))
+        if order.status not in OrderStatus.OPEN:
+            return Response({"error": "Only open orders can be cancelled"}, status=400)
 
-        bids = orders.filter(direction="BUY").values("price").annotate(qty=Sum("remaining_qty")).order_by("-price")[:limit]
-        asks = orders.filter(direction="SELL").values("price").annotate(qty=Sum("remaining_qty")).order_by("price")[:limit]
+        if not OrderMatchingEngine.cancel_order(order):
+            return Response({"error": "Only open orders can be cancelled"}, status=400)
+        return Response({"success": True})
 
-        serializer = OrderbookSerializer({"bids": bids, "asks": asks})
-        return Response(serializer.data)
+class OrderBookView(APIView):
+    throttle_classes = [MarketDataThrottle]
+
+    def get(self, request, ticker):
+        limit = min(int(request.query_params.get("limit", 10)), marketdata.ORDERBOOK_DEPTH)
+        snapshot = marketdata.regions.read(ticker) if marketdata.enabled() and limit >= 0 else None
+        if snapshot is not None:
+            return JSONBytesResponse(snapshot.orderbook(limit))
+        bids, asks, tick_size = marketdata.load_orderbook(ticker, limit)
+        return JSONBytesResponse(encode_orderbook(bids, asks, tick_size or 1))
 
 class TransactionHistoryView(APIView):
+    throttle_classes = [MarketDataThrottle]
+
     def get(self, request, ticker):
-        limit = min(int(request.query_params.get("limit", 10)), 100)
-        transactions = Transaction.objects.filter(ticker=ticker).order_by("-timestamp")[:limit]
-        data = [{"ticker": t.ticker, "amount": t.amount, "price": t.price, "timestamp": t.timestamp.isoformat()} for t in transactions]
-        return Response(data)
+        limit = min(int(request.query_params.get("limit", 10)), marketdata.TRANSACTIONS_DEPTH)
+        since = request.query_params.get("since")
+        if since is None and marketdata.enabled() and limit >= 0:
+            snapshot = marketdata.regions.read(ticker)
+            if snapshot is not None:
+                return JSONBytesResponse(snapshot.transactions(limit))
+        tick_size = Instrument.objects.filter(ticker=ticker).values_list("tick_size", flat=True).first()
+        if tick_size is None:
+            return JSONBytesResponse(encode_transactions((), 1))
+        if since is not None:
+            # Курсор для опроса: новые сделки по возрастанию seq (в архиве их нет)
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({"error": "since must be an integer"}, status=422)
+            transactions = Transaction.objects.filter(ticker=ticker, seq__gt=since).order_by("seq").values_list(*marketdata.TRANSACTION_FIELDS)[:limit]
+            return JSONBytesResponse(encode_transactions(transactions, tick_size))
+        return JSONBytesResponse(encode_transactions(marketdata.load_transactions(ticker, limit), tick_size))
+
+class TickerStatsView(APIView):
+    throttle_classes = [MarketDataThrottle]
+
+    def get(self, request, ticker=None):
+        """24h-сводка по тикеру или по всем инструментам (без ticker)"""
+        instruments = Instrument.objects.values_list("ticker", "tick_size")
+        if ticker is not None:
+            instruments = instruments.filter(ticker=ticker)
+        instruments = list(instruments.order_by("ticker"))
+        # Лучшие цены — из снимка стакана; без снимка — из открытых ордеров
+        best = {}
+        if marketdata.enabled():
+            for t, _ in instruments:
+                snapshot = marketdata.regions.read(t)
+                if snapshot is not None:
+                    best[t] = (snapshot.best_bid, snapshot.best_ask)
+        missing = [t for t, _ in instruments if t not in best]
+        if missing:
+            open_orders = LimitOrder.objects.filter(status__in=OrderStatus.OPEN)
+            if len(missing) < len(instruments) or ticker is not None:
+                open_orders = open_orders.filter(ticker__in=missing)
+            # Один сгруппированный запрос по покрывающему индексу открытых ордеров
+            best.update(
+                (row[0], row[1:]) for row in open_orders.values_list("ticker").annotate(
+                    bid=Max("price_ticks", filter=Q(direction="BUY")),
+                    ask=Min("price_ticks", filter=Q(direction="SELL")),
+                )
+            )
+
+        ticker_stats.refresh()
+        rows = [
+            (t, tick_size, ticker_stats.summary(t), *best.get(t, (None, None)))
+            for t, tick_size in instruments
+        ]
+        if ticker is not None:
+            if not rows:
+                return Response({"error": "Unknown instrument"}, status=404)
+            return JSONBytesResponse(encode_ticker_stats(rows)[1:-1])
+        return JSONBytesResponse(encode_ticker_stats(rows))
 
 class InstrumentListView(APIView):
+    throttle_classes = [MarketDataThrottle]
+
     def get(self, request):
-        instruments = Instrument.objects.all()
-        data = [{"ticker": i.ticker, "name": i.name} for i in instruments]
-        return Response(data)
+        instruments = Instrument.objects.values_list("ticker", "name", "tick_size", "lot_size")
+        return JSONBytesResponse(encode_instruments(instruments))
+
+class ExecutionListView(APIView):
+    permission_classes = [HasAPIKey]
+    throttle_classes = [MarketDataThrottle]
+
+    def get(self, request):
+        """Исполнения пользователя с номером seq > since, по возрастанию seq"""
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = min(int(request.query_params.get("limit", 100)), 500)
+        except ValueError:
+            return Response({"error": "since and limit must be integers"}, status=422)
+
+        user = get_user_from_token(request)
+        # seq резервируется в транзакции сделки, а писатель один: номера
+        # коммитятся по возрастанию, и за курсором не появится меньший seq
+        rows = list(
+            Execution.objects.filter(user_id=user.id, seq__gt=since).order_by("seq", "id").values_list(
+                "seq", "trade_id", "order_id", "ticker", "direction", "liquidity", "qty", "price_ticks", "timestamp"
+            )[:limit + 1]
+        )
+        if len(rows) > limit:
+            # Две записи самосделки не разрезаем между страницами
+            boundary = rows[limit][0]
+            rows = [row for row in rows[:limit] if row[0] != boundary] or [row for row in rows if row[0] == boundary]
+        tick_sizes = dict(Instrument.objects.filter(ticker__in={row[3] for row in rows}).values_list("ticker", "tick_size"))
+        next_since = rows[-1][0] if rows else since
+        return JSONBytesResponse(b'{"executions":%s,"next_since":%d}' % (encode_executions(rows, tick_sizes), next_since))
 
 class BalanceView(APIView):
     permission_classes = [HasAPIKey]
 
     def get(self, request):
         user = get_user_from_token(request)
-        balances = Balance.objects.filter(user=user)
-        result = {
-            balance.ticker: {
-                "amount": balance.amount,
-                "blocked": balance.blocked
-            } for balance in balances
-        }
-        return Response(result)
+        balances = Balance.objects.filter(user=user).values_list("ticker", "amount", "blocked")
+        return JSONBytesResponse(encode_balances_detailed(balances))
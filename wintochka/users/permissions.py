@@ -1,18 +1,31 @@
+from django.core.exceptions import ValidationError
 from rest_framework.permissions import BasePermission
 from users.models import User
 
+
+def authenticate_api_key(request):
+    """Пользователь по заголовку "TOKEN <api_key>" или None.
+
+    Результат запоминается на request: permission-класс и view
+    (get_user_from_token) обходятся одним запросом к users_user.
+    """
+    if not hasattr(request, "api_user"):
+        auth_header = request.headers.get("Authorization")
+        user = None
+        if auth_header and auth_header.startswith("TOKEN "):
+            try:
+                user = User.objects.filter(api_key=auth_header.split("TOKEN ")[1]).first()
+            except ValidationError:
+                user = None
+        request.api_user = user
+    return request.api_user
+
+
 class HasAPIKey(BasePermission):
     def has_permission(self, request, view):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("TOKEN "):
-            return False
-        token = auth_header.split("TOKEN ")[1]
-        return User.objects.filter(api_key=token).exists()
+        return authenticate_api_key(request) is not None
 
 class IsAdminAPIKey(BasePermission):
     def has_permission(self, request, view):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("TOKEN "):
-            return False
-        token = auth_header.split("TOKEN ")[1]
-        return User.objects.filter(api_key=token, role="ADMIN").exists()
+        user = authenticate_api_key(request)
+        return user is not None and user.role == "ADMIN"
@@ -1,3 +1,50 @@
-from django.test import TestCase
+import os
+import sqlite3
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import override_settings
+
+from users import throttling
+from wintochka.testing import QueryBudgetTestCase
+
+
+class RegisterQueryBudgetTest(QueryBudgetTestCase):
+    def test_register(self):
+        response = self.request(1, "post", "/api/v1/public/register", data={"name": "alice"}, status=200)
+        self.assertEqual(response.json()["name"], "alice")
+
+
+@override_settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"market_data": "2/minute"}})
+class TokenBucketThrottleTest(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(throttling, "store", throttling.RateLimitStore(os.path.join(directory.name, "ratelimit.sqlite3")))
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.make_instrument("MEM")
+
+    def get(self, token):
+        return self.client.get("/api/v1/orderbook/MEM", HTTP_AUTHORIZATION=f"TOKEN {token}").status_code
+
+    def test_unverified_keys_share_ip_bucket(self):
+        self.assertEqual([self.get(token) for token in ("bogus1", "bogus2", "bogus3")], [200, 200, 429])
+        # Настоящий ключ — свой бакет
+        self.assertEqual(self.get(self.admin.api_key), 200)
+
+    def test_prune_idle_buckets(self):
+        self.get(self.admin.api_key)
+        self.store.prune("market_data:", 60)
+        self.assertEqual(self.store.conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0], 1)
+        with mock.patch.object(time, "time", return_value=time.time() + 61):
+            self.store.prune("market_data:", 60)
+        self.assertEqual(self.store.conn.execute("SELECT COUNT(*) FROM buckets").fetchone()[0], 0)
+
+    def test_locked_store_is_retryable(self):
+        with mock.patch.object(self.store, "consume", side_effect=sqlite3.OperationalError("database is locked")):
+            response = self.client.get("/api/v1/orderbook/MEM", HTTP_AUTHORIZATION=f"TOKEN {self.admin.api_key}")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
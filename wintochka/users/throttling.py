@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .permissions import authenticate_api_key
+
+# Состояние лимитов хранится в отдельном локальном SQLite-файле, общем для всех
+# воркеров на хосте: BEGIN IMMEDIATE сериализует read-modify-write бакета, так
+# что лимит соблюдается глобально, а не per-process.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS inflight (slot TEXT PRIMARY KEY, started REAL NOT NULL);
+"""
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'20/second' -> (capacity=20, refill=20 токенов в секунду)"""
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class RateLimitStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key, capacity, refill):
+        """Списывает токен. Возвращает (allowed, секунд до появления токена)"""
+        conn = self.conn
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / refill
+
+    def prune(self, prefix, idle):
+        """Удаляет бакеты с ключами prefix*, не тронутые дольше idle секунд.
+
+        За это время бакет наполняется до capacity — ровно как отсутствующий.
+        """
+        # Диапазон по ключу вместо LIKE, чтобы шёл по первичному ключу
+        self.conn.execute(
+            "DELETE FROM buckets WHERE key >= ? AND key < ? AND updated < ?",
+            (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), time.time() - idle),
+        )
+
+    @contextmanager
+    def inflight(self):
+        slot = uuid.uuid4().hex
+        self.conn.execute("INSERT INTO inflight (slot, started) VALUES (?, ?)", (slot, time.time()))
+        try:
+            yield
+        finally:
+            self.conn.execute("DELETE FROM inflight WHERE slot = ?", (slot,))
+
+    def inflight_count(self, stale_after):
+        # Слоты упавших воркеров не удаляются сами, поэтому старые записи не считаем
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM inflight WHERE started > ?", (time.time() - stale_after,)
+        ).fetchone()[0]
+
+
+store = RateLimitStore(settings.RATELIMIT_DB)
+
+
+_pruned = {}
+
+
+class APIKeyTokenBucketThrottle(BaseThrottle):
+    """Token bucket на пару (пользователь, класс эндпоинта); остальных считаем по IP.
+
+    Пользователь — только проверенный по API-ключу: ключ из заголовка как есть
+    позволил бы обходить лимит, подставляя случайные значения.
+    """
+    scope = None
+
+    def __init__(self):
+        self.capacity, self.refill = parse_rate(settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"][self.scope])
+        self.retry_after = None
+
+    def allow_request(self, request, view):
+        user = authenticate_api_key(request)
+        ident = f"user:{user.id}" if user is not None else f"ip:{self.get_ident(request)}"
+        allowed, self.retry_after = store.consume(f"{self.scope}:{ident}", self.capacity, self.refill)
+        self._prune()
+        return allowed
+
+    def _prune(self):
+        now = time.time()
+        if now - _pruned.get(self.scope, 0) < settings.RATELIMIT_PRUNE_INTERVAL:
+            return
+        _pruned[self.scope] = now
+        store.prune(f"{self.scope}:", self.capacity / self.refill)
+
+    def wait(self):
+        return self.retry_after
+
+
+class OrderEntryThrottle(APIKeyTokenBucketThrottle):
+    scope = "orders"
+
+
+class CancelThrottle(APIKeyTokenBucketThrottle):
+    scope = "cancels"
+
+
+class MarketDataThrottle(APIKeyTokenBucketThrottle):
+    scope = "market_data"
+
+
+def matching_queue_depth():
+    depth = store.inflight_count(settings.MATCHING_SLOT_TIMEOUT)
+    if settings.ORDER_INTAKE_MODE == "async":
+        from orders.intake import queue_depth
+        depth += queue_depth()
+    return depth
+
+
+class MatchingBackpressureThrottle(BaseThrottle):
+    """Отдаёт 429, пока очередь на матчинг глубже MATCHING_QUEUE_MAX_DEPTH"""
+
+    def allow_request(self, request, view):
+        return matching_queue_depth() < settings.MATCHING_QUEUE_MAX_DEPTH
+
+    def wait(self):
+        return settings.MATCHING_RETRY_AFTER
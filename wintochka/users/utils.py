@@ -1,13 +1,12 @@
-from users.models import User
 from rest_framework.exceptions import AuthenticationFailed
+from users.permissions import authenticate_api_key
 
 def get_user_from_token(request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("TOKEN "):
         raise AuthenticationFailed("Invalid or missing TOKEN header")
 
-    token = auth_header.split("TOKEN ")[1]
-    try:
-        return User.objects.get(api_key=token)
-    except User.DoesNotExist:
+    user = authenticate_api_key(request)
+    if user is None:
         raise AuthenticationFailed("Invalid API key")
+    return user
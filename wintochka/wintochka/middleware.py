@@ -0,0 +1,35 @@
+import logging
+import sqlite3
+
+from django.conf import settings
+from django.db import OperationalError
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseBusyMiddleware:
+    """"database is locked" -> 503 с Retry-After вместо 500.
+
+    Лок не дождались внутри транзакции (или на её COMMIT), значит она
+    откатилась и запрос можно повторить. Клиенту это единственный 5xx,
+    который безопасно повторять: 500 остаются настоящими ошибками.
+    После коммита в БД ничто не ходит без перехвата ошибок (публикация
+    market data ловит всё сама). Бакеты троттлинга лежат в отдельной
+    SQLite-базе на голом sqlite3 (users/throttling.py), и её лок приходит
+    как sqlite3.OperationalError — до view, так что повторять тоже можно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, (OperationalError, sqlite3.OperationalError)) or "locked" not in str(exception):
+            return None
+        logger.warning(f"Database busy on {request.method} {request.path}: {exception}")
+        response = JsonResponse({"error": "Database is busy, retry later"}, status=503)
+        response["Retry-After"] = str(settings.MATCHING_RETRY_AFTER)
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -52,6 +53,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'admin_api.profiling.ProfilingMiddleware',
+    'wintochka.middleware.DatabaseBusyMiddleware',
 ]
 
 ROOT_URLCONF = 'wintochka.urls'
@@ -74,6 +77,47 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'wintochka.wsgi.application'
 
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_RATES': {
+        'orders': '20/second',
+        'cancels': '20/second',
+        'market_data': '50/second',
+    },
+}
+
+# Token bucket'ы и счётчик ордеров в матчинге, общие для всех воркеров хоста.
+# Файл — рабочее состояние, не часть проекта, поэтому по умолчанию вне BASE_DIR
+RATELIMIT_DB = os.environ.get('RATELIMIT_DB') or os.path.join(tempfile.gettempdir(), 'wintochka-ratelimit.sqlite3')
+RATELIMIT_PRUNE_INTERVAL = 60
+MATCHING_QUEUE_MAX_DEPTH = 32
+MATCHING_SLOT_TIMEOUT = 30
+MATCHING_RETRY_AFTER = 1
+
+# Стакан и последние сделки в общей для воркеров mmap-области (orders/marketdata.py),
+# например /dev/shm/wintochka; None — публичные эндпоинты читают БД
+MARKET_DATA_DIR = os.environ.get('MARKET_DATA_DIR') or None
+MARKET_DATA_REGION_BYTES = 64 * 1024
+
+# "sync" — матчинг внутри запроса (201), "async" — 202 и очередь для manage.py run_matching
+ORDER_INTAKE_MODE = os.environ.get('ORDER_INTAKE_MODE', 'sync')
+MATCHING_BATCH_SIZE = 100
+
+# manage.py archive_orders переносит в архив то, что старше этого срока
+ARCHIVE_RETENTION_DAYS = 7
+
+# Фоновое удаление пользователей: размер пачки и пауза между пачками (сек)
+USER_DELETION_BATCH_SIZE = 500
+USER_DELETION_BATCH_PAUSE = 0.01
+
+# Профилирование запросов (admin_api/profiling.py): заголовок X-Profile от админа
+# или автоматически для запросов дольше PROFILING_SLOW_REQUEST_MS (None — выключено)
+PROFILING_SLOW_REQUEST_MS = None
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_KEEP = 100
+PROFILING_TOP_FUNCTIONS = 40
+# Период сэмплирующего профайлера медленных запросов
+PROFILING_SAMPLE_INTERVAL_MS = 5
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -81,7 +125,7 @@ WSGI_APPLICATION = 'wintochka.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('WINTOCHKA_DB', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
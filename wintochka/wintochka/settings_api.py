@@ -0,0 +1,44 @@
+"""
+Профиль только для JSON API: DJANGO_SETTINGS_MODULE=wintochka.settings_api.
+
+Без django.contrib.admin, sessions, messages, staticfiles, шаблонов и
+browsable API — ничего из этого API не использует, а воркер платит за них
+импортом при старте и middleware на каждом запросе. auth и contenttypes
+остаются: на auth ссылается граф миграций orders. SecurityMiddleware и
+CommonMiddleware тоже остаются: заголовки безопасности и проверка Host по
+ALLOWED_HOSTS (request.get_host()). Сравнение с полным
+профилем: manage.py profile_startup.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'users',
+    'balances',
+    'orders',
+    'admin_api',
+    'instruments',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'admin_api.profiling.ProfilingMiddleware',
+    'wintochka.middleware.DatabaseBusyMiddleware',
+]
+
+ROOT_URLCONF = 'wintochka.urls_api'
+
+TEMPLATES = []
+
+# Аутентификация — по API-ключу в permission-классах; request.user не нужен
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+AUTH_PASSWORD_VALIDATORS = []
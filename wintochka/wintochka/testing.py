@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from balances.models import Balance
+from instruments.models import Instrument
+from orders.stats import ticker_stats
+from users.models import User
+
+# Общая часть тестов на бюджет SQL-запросов (tests.py приложений). Каждый
+# сценарий прогоняется на данных растущего размера (SIZES): бюджет задаётся
+# либо константой, либо как base + per_item * size для путей, которые
+# линейны по природе (рыночный ордер, съедающий N уровней стакана). При
+# превышении тест падает со списком выполненных запросов.
+
+SIZES = (1, 10, 100)
+
+# Лимиты не должны влиять на счёт запросов: бакеты хранятся вне основной БД,
+# но при исчерпании view отвечал бы 429 до выполнения самого запроса
+UNTHROTTLED = {
+    "DEFAULT_THROTTLE_RATES": {
+        "orders": "100000/second",
+        "cancels": "100000/second",
+        "market_data": "100000/second",
+    },
+}
+
+
+@override_settings(REST_FRAMEWORK=UNTHROTTLED, MATCHING_QUEUE_MAX_DEPTH=10 ** 9)
+class QueryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Буфер статистики живёт в памяти процесса, а id сделок после отката
+        # тестовой транзакции переиспользуются
+        ticker_stats.reset()
+        self.admin = self.make_user("admin", role="ADMIN")
+
+    def make_user(self, name, role="USER", **balances):
+        user = User.objects.create(name=name, role=role)
+        Balance.objects.bulk_create([Balance(user=user, ticker=t, amount=a) for t, a in balances.items()])
+        return user
+
+    def make_instrument(self, ticker="MEM", **fields):
+        instrument = Instrument(ticker=ticker, name=ticker, **fields)
+        # То же правило, что в админском API: иначе стоимость лота дробная
+        lot_value = instrument.lot_size * instrument.tick_size
+        self.assertEqual(lot_value, lot_value.to_integral_value(), f"{ticker}: lot_size * tick_size must be whole")
+        instrument.save()
+        return instrument
+
+    def ticker_for(self, size):
+        """Свой тикер для каждого размера: 1 -> SZB, 10 -> SZBA, 100 -> SZBAA"""
+        return "SZ" + "".join(chr(ord("A") + int(digit)) for digit in str(size))
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"TOKEN {user.api_key}"}
+
+    def request(self, budget, method, path, user=None, data=None, status=None, on_commit=True):
+        """Выполняет запрос и проверяет, что он уложился в budget SQL-запросов"""
+        queries = self.capture(method, path, user, data, status, on_commit)
+        self.assertWithinBudget(queries, budget, f"{method.upper()} {path}")
+        return queries.response
+
+    def assertWithinBudget(self, queries, budget, label):
+        if len(queries) <= budget:
+            return
+        listing = "\n".join(f"  {i}. {q['sql']}" for i, q in enumerate(queries.captured_queries, 1))
+        self.fail(f"{label}: {len(queries)} queries, budget {budget}\n{listing}")
+
+    def assertScales(self, scenario, base, per_item=0, sizes=SIZES):
+        """scenario(size) выполняет проверяемый вызов и возвращает CaptureQueriesContext.
+
+        per_item=0 — число запросов не должно расти с размером данных.
+        """
+        counts = {}
+        for size in sizes:
+            with self.subTest(size=size):
+                queries = scenario(size)
+                counts[size] = len(queries)
+                self.assertWithinBudget(queries, base + per_item * size, f"{scenario.__name__}(size={size})")
+        if per_item == 0:
+            self.assertEqual(len(set(counts.values())), 1, f"{scenario.__name__}: query count grows with data: {counts}")
+        return counts
+
+    def capture(self, method, path, user=None, data=None, status=None, on_commit=True):
+        """Выполняет запрос, возвращает CaptureQueriesContext с ответом в .response.
+
+        on_commit=True исполняет on_commit-колбэки (публикация снимков рынка)
+        как после настоящего коммита; их запросы не считаются.
+        """
+        headers = self.auth(user) if user is not None else {}
+        call = getattr(self.client, method)
+        with self.captureOnCommitCallbacks(execute=on_commit):
+            with CaptureQueriesContext(connection) as queries:
+                response = call(path, data, format="json", **headers) if data is not None else call(path, **headers)
+        if status is not None:
+            self.assertEqual(response.status_code, status, response.content[:500])
+        queries.response = response
+        return queries
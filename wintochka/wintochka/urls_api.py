@@ -0,0 +1,9 @@
+from django.urls import path, include
+
+# Те же маршруты, что в wintochka.urls, без django admin
+urlpatterns = [
+    path("", include("users.urls")),
+    path('', include('balances.urls')),
+    path('', include('orders.urls')),
+    path('', include("admin_api.urls"))
+]
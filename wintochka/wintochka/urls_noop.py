@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+# Пустой view для manage.py profile_startup: накладные расходы профиля
+# настроек на запрос без работы самого API
+
+
+@csrf_exempt
+def noop(request):
+    return HttpResponse(b"{}", content_type="application/json")
+
+
+urlpatterns = [path("noop", noop)]